@@ -1,15 +1,28 @@
-from port_state import ProblemInstance, PortState
+from port_state import PortState
+from event_engine import EventDrivenSimulation
+from trajectory import Trajectory
+from recording import FullRecorder, FinalStateRecorder, make_recorder
+from metrics import default_metrics, write_summary
+from matching import linear_sum_assignment
+from instance_bank import instance_sources, load_instance, source_name
+from profiling import Profiler, NullProfiler, merge_reports, format_report, write_report
+from result_cache import Manifest, SIMULATION_FILES, code_version, task_key
 import random
-import json
 import os
 import datetime
-import pickle
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
 import numpy as np
 
 
 class RandomAlgorithm:
+    def __init__(self, seed=None):
+        # each algorithm has its own random stream, so runs don't depend on the global random state (or on other processes)
+        self.rng = random.Random(seed)
+
     def choose(self, assignments, state: PortState):
-        return random.choice(assignments)  # to choose a random assignment
+        return self.rng.choice(assignments)  # to choose a random assignment
 
 
 class GreedyAlgorithm:
@@ -22,10 +35,8 @@ class GreedyAlgorithm:
             if vessel_id == 'ORIGIN':
                 return (barge_id, vessel_id)
 
-            barge_state = next(
-                b for b in state.barge_states if b.barge.id == barge_id)
-            vessel_state = next(
-                v for v in state.vessel_states if v.vessel.id == vessel_id)
+            barge_state = state.get_barge_state(barge_id)
+            vessel_state = state.get_vessel_state(vessel_id)
 
             remaining_time = vessel_state.vessel.departure_time - \
                 state.time  # how much time left we have to supply this vessel
@@ -55,74 +66,553 @@ class GreedyAlgorithm:
         return best_assignment
 
 
-def solve(algorithm, instance):
-    port_state = PortState(instance)
-    states = []
+def pair_arrays(pairs, state: PortState):
+    """
+    Returns, for a list of (barge_id, vessel_id) pairs, the position of each pair's barge and vessel among the
+    distinct ones (b, v), how many there are, and the barge and vessel attributes used by the greedy criteria, per pair.
+    """
+    barge_ids = {}
+    vessel_ids = {}
+    b = np.array([barge_ids.setdefault(barge_id, len(barge_ids)) for barge_id, _ in pairs])
+    v = np.array([vessel_ids.setdefault(vessel_id, len(vessel_ids)) for _, vessel_id in pairs])
+    barge_states = [state.get_barge_state(barge_id) for barge_id in barge_ids]
+    vessel_states = [state.get_vessel_state(vessel_id) for vessel_id in vessel_ids]
+    return b, v, len(barge_ids), len(vessel_ids), {
+        'fuel': np.array([x.current_fuel for x in barge_states], dtype=float)[b],
+        'location': np.array([x.location for x in barge_states], dtype=float)[b],
+        'demand': np.array([x.current_fuel_demand for x in vessel_states], dtype=float)[v],
+        'remaining_time': np.maximum(np.array([x.vessel.departure_time for x in vessel_states])[v] - state.time, 1),
+        'position': np.array([x.vessel.get_position() for x in vessel_states], dtype=float)[v],
+    }
+
+
+class VectorizedGreedyAlgorithm:
+    """
+    Makes the same choices as GreedyAlgorithm, but scores every candidate pair at once with NumPy and returns, from
+    one call to `choose_many`, all the assignments GreedyAlgorithm would make one by one in that minute.
+    """
+    def choose(self, assignments, state: PortState):
+        return self.choose_many(assignments, state)[0]
+
+    def choose_many(self, assignments, state: PortState):
+        # a barge that must go to the ORIGIN still goes first. Low-fuel barges only ever get the ORIGIN, and once it's
+        # locked nobody else can, so the rest of the choices are made between the vessel pairs
+        chosen = [a for a in assignments if a[1] == 'ORIGIN'][:1]
+        pairs = [a for a in assignments if a[1] != 'ORIGIN']
+        if not pairs:
+            return chosen
+        b, v, num_barges, num_vessels, x = pair_arrays(pairs, state)
+
+        # Choosing a pair doesn't change the scores of the others, so taking the pairs in this order, and skipping the
+        # ones whose barge or vessel is already taken, gives the same choices as re-running GreedyAlgorithm each time
+        order = self.rank(x)
+        barge_taken = np.zeros(num_barges, dtype=bool)
+        vessel_taken = np.zeros(num_vessels, dtype=bool)
+        for i in order:
+            if not barge_taken[b[i]] and not vessel_taken[v[i]]:
+                barge_taken[b[i]] = vessel_taken[v[i]] = True
+                chosen.append(pairs[i])
+        return chosen
+
+    @staticmethod
+    def rank(x):
+        """
+        Returns the order of the pairs of `pair_arrays` from the best GreedyAlgorithm score to the worst.
+        """
+        # the criteria of GreedyAlgorithm's score, with the same arithmetic
+        fuel_ratio = x['demand'] / x['remaining_time']
+        can_fully_supply = (x['fuel'] >= x['demand']).astype(int)
+        fuel_left = np.where(can_fully_supply, 0, x['fuel'])
+        distance = np.abs(x['location'] - x['position'])
+        # lexsort is stable, so ties keep the order of the pairs, as in GreedyAlgorithm
+        return np.lexsort((distance, -fuel_left, -can_fully_supply, -fuel_ratio))
+
+
+class NearestGreedyAlgorithm(VectorizedGreedyAlgorithm):
+    """
+    VectorizedGreedyAlgorithm scoring each free barge only against its `nearest` closest waiting vessels, instead of
+    against every waiting vessel: solve asks the state for those pairs alone, which PortState finds with its position
+    index. The choices differ from the greedy's only when a farther vessel has a better score; with `nearest` at least
+    the number of waiting vessels they are the same.
+    """
+    def __init__(self, nearest=5):
+        self.nearest = nearest
+
+
+class MatchingAlgorithm:
+    """
+    Assigns the free barges of a minute all together, with the barge x vessel matching of highest total value
+    instead of GreedyAlgorithm's best pair first. The value of a pair weighs GreedyAlgorithm's criteria against each
+    other instead of comparing them in order: the fuel ratio (relative to the highest one), plus `full_supply_weight`
+    if the barge can fully supply the vessel, plus `fuel_left_weight` times the fuel of a barge that can't (relative
+    to the most fuel), minus `distance_weight` times the distance (relative to the farthest berth).
+    Low-fuel barges go to the ORIGIN first, as in GreedyAlgorithm.
+    """
+    def __init__(self, full_supply_weight=0.2, fuel_left_weight=0.1, distance_weight=3):
+        self.full_supply_weight = full_supply_weight
+        self.fuel_left_weight = fuel_left_weight
+        self.distance_weight = distance_weight
+        self._channel = (None, 1) # (instance, position of its farthest berth)
+
+    def choose(self, assignments, state: PortState):
+        return self.choose_many(assignments, state)[0]
+
+    def choose_many(self, assignments, state: PortState):
+        chosen = [a for a in assignments if a[1] == 'ORIGIN'][:1]
+        pairs = [a for a in assignments if a[1] != 'ORIGIN']
+        if not pairs:
+            return chosen
+        b, v, num_barges, num_vessels, x = pair_arrays(pairs, state)
+        if self._channel[0] is not state.problem_instance:
+            self._channel = (state.problem_instance, max(max(v.get_position() for v in state.problem_instance.vessels), 1))
+        value = self.value(x, self._channel[1])
+
+        # pairs that aren't candidates cost more than any set of candidates, so they are only used when nothing else is left
+        cost = np.full((num_barges, num_vessels), (value.max() - value.min() + 1) * min(num_barges, num_vessels) + 1)
+        cost[b, v] = value.max() - value
+        pair_index = np.full((num_barges, num_vessels), -1)
+        pair_index[b, v] = np.arange(len(pairs))
+        rows, cols = linear_sum_assignment(cost)
+        chosen.extend(pairs[i] for i in pair_index[rows, cols] if i >= 0)
+        return chosen
+
+    def value(self, x, channel_length):
+        """
+        Returns the value of each pair of `pair_arrays`.
+        """
+        # the criteria of GreedyAlgorithm's score
+        fuel_ratio = x['demand'] / x['remaining_time']
+        can_fully_supply = x['fuel'] >= x['demand']
+        fuel_left = np.where(can_fully_supply, 0, x['fuel'])
+        distance = np.abs(x['location'] - x['position'])
+        return fuel_ratio / max(fuel_ratio.max(), 1e-9) \
+            + self.full_supply_weight * can_fully_supply \
+            + self.fuel_left_weight * fuel_left / max(x['fuel'].max(), 1e-9) \
+            - self.distance_weight * distance / channel_length
+
+
+class RolloutAlgorithm:
+    """
+    Looks ahead before committing. Each of the `max_candidates` best assignments for the greedy score is tried on a
+    fork of the state, followed by `horizon` minutes where the `base` policy (the greedy by default) decides everything
+    else. The assignment after which the vessels still need the least fuel is chosen; ties go to the greedy order.
+    The forks are snapshots restored into one scratch state, so a few hundred of them per decision stay cheap.
+    """
+    def __init__(self, horizon=180, max_candidates=8, base=None):
+        self.horizon = horizon
+        self.max_candidates = max_candidates
+        self.base = base or VectorizedGreedyAlgorithm()
+
+    def choose(self, assignments, state: PortState):
+        # as in GreedyAlgorithm, a barge that must go to the ORIGIN doesn't compete
+        for assignment in assignments:
+            if assignment[1] == 'ORIGIN':
+                return assignment
+        if len(assignments) == 1:
+            return assignments[0]
+
+        candidates = [assignments[i] for i in VectorizedGreedyAlgorithm.rank(pair_arrays(assignments, state)[4])[:self.max_candidates]]
+        until = min(state.time + self.horizon, max(v.vessel.departure_time for v in state.vessel_states))
+        scratch = state.clone()
+        scratch.profiler = None # the rollouts aren't part of the simulation being profiled
+        snapshot = scratch.snapshot()
+        best_demand = None
+        best_assignment = None
+        for barge_id, vessel_id in candidates:
+            scratch.restore(snapshot)
+            scratch.apply_assignment(barge_id, vessel_id)
+            demand = self.rollout(scratch, until)
+            if best_demand is None or demand < best_demand:
+                best_demand = demand
+                best_assignment = (barge_id, vessel_id)
+        return best_assignment
+
+    def rollout(self, state: PortState, until):
+        """
+        Simulates, in place, until the given time with the base policy, and returns the fuel the vessels still need.
+        """
+        while True:
+            assignments = state.get_possible_assignments()
+            while assignments:
+                for barge_id, target in self.base.choose_many(assignments, state):
+                    state.apply_assignment(barge_id, target)
+                assignments = state.get_possible_assignments()
+            if state.time >= until:
+                return sum(v.current_fuel_demand for v in state.vessel_states)
+            state.step()
+
+
+class TranspositionTable:
+    """
+    Values of already evaluated states, by their PortState.state_key (the key itself, not its hash, so that distinct
+    states never share a value). At most `max_entries` are kept; the least recently used ones are dropped first.
+    """
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.values = OrderedDict()
+        self.hits = 0
+
+    def get(self, key):
+        value = self.values.get(key)
+        if value is not None:
+            self.values.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.values[key] = value
+        self.values.move_to_end(key)
+        if len(self.values) > self.max_entries:
+            self.values.popitem(last=False)
+
+
+class BeamSearchAlgorithm:
+    """
+    Plans all the decisions of the simulation with a beam search, the first time it is asked to choose, and then
+    follows the plan (planning again if the state ever leaves it).
+
+    The nodes are the states at the minutes where assignments are possible. A node's children take one of the
+    `branching` best assignments for the greedy score, complete the minute with the greedy policy and run to the next
+    minute with a choice. Each node is valued by the fuel the vessels still need at the end if the greedy policy
+    decides everything from there (simulated with the event-driven engine), and the `beam_width` best nodes of each
+    depth are expanded. Decision orders that lead to the same state are only expanded once, and the values are
+    memoized in a TranspositionTable of at most `max_entries` states.
+    The greedy decisions are always among the children, so the plan is never worse than the greedy solution.
+    """
+    def __init__(self, beam_width=3, branching=3, max_entries=100_000):
+        self.beam_width = beam_width
+        self.branching = branching
+        self.base = VectorizedGreedyAlgorithm()
+        self.table = TranspositionTable(max_entries)
+        self.plan = {} # time -> assignments to make in that minute, in order
+
+    def choose(self, assignments, state: PortState):
+        planned = self.plan.get(state.time)
+        if not planned or planned[0] not in assignments:
+            self.plan = self.search(state)
+            planned = self.plan[state.time]
+        assignment = planned.pop(0)
+        if not planned:
+            del self.plan[state.time]
+        return assignment
+
+    def choose_many(self, assignments, state: PortState):
+        planned = self.plan.pop(state.time, None)
+        if not planned or not all(a in assignments for a in planned):
+            self.plan = self.search(state)
+            planned = self.plan.pop(state.time)
+        return planned
+
+    def search(self, state: PortState):
+        max_time = max(v.vessel.departure_time for v in state.vessel_states)
+        beam = [([], state.clone())] # (decisions so far, state at a minute with a choice)
+        best_value = None
+        best_decisions = None
+        seen = set()
+        while beam:
+            children = []
+            for decisions, node in beam:
+                for assignments, child in self.expand(node, max_time):
+                    key = child.state_key()
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    child_decisions = decisions + [(node.time, assignments)]
+                    value = self.evaluate(child, key, max_time)
+                    if child.time > max_time:
+                        if best_value is None or value < best_value:
+                            best_value = value
+                            best_decisions = child_decisions
+                    else:
+                        children.append((value, child_decisions, child))
+            # sort is stable, so on ties the nodes closer to the greedy decisions come first
+            children.sort(key=lambda child: child[0])
+            beam = [(child_decisions, child) for _, child_decisions, child in children[:self.beam_width]]
+        return {time: list(assignments) for time, assignments in best_decisions}
+
+    def expand(self, node: PortState, max_time):
+        """
+        Yields (assignments made, child state) for the children of a node.
+        """
+        assignments = node.get_possible_assignments()
+        origin = [a for a in assignments if a[1] == 'ORIGIN'][:1] # goes first, as in GreedyAlgorithm
+        pairs = [a for a in assignments if a[1] != 'ORIGIN']
+        firsts = [pairs[i] for i in VectorizedGreedyAlgorithm.rank(pair_arrays(pairs, node)[4])[:self.branching]] if pairs else [None]
+        for first in firsts:
+            child = node.clone()
+            made = []
+            for assignment in origin + ([first] if first else []):
+                child.apply_assignment(*assignment)
+                made.append(assignment)
+            remaining = child.get_possible_assignments()
+            while remaining:
+                for assignment in self.base.choose_many(remaining, child):
+                    child.apply_assignment(*assignment)
+                    made.append(assignment)
+                remaining = child.get_possible_assignments()
+            # on to the next minute with a choice, or past the end
+            child.step()
+            while child.time <= max_time and not child.get_possible_assignments():
+                child.step()
+            yield made, child
+
+    def evaluate(self, state: PortState, key, max_time):
+        if state.time > max_time:
+            return sum(v.current_fuel_demand for v in state.vessel_states)
+        value = self.table.get(key)
+        if value is None:
+            # every state with a choice on the way has the same value, and the child taking the greedy decisions of
+            # a node is one of them, so they are all memoized
+            simulation = EventDrivenSimulation(state.problem_instance, state.clone())
+            visited = []
+            while simulation.port_state.time <= max_time:
+                if simulation.port_state.get_possible_assignments():
+                    visited.append(simulation.port_state.state_key())
+                simulation.decide(self.base)
+                simulation.advance_to(simulation.next_event_time())
+            value = sum(v.current_fuel_demand for v in simulation.port_state.vessel_states)
+            for visited_key in visited:
+                self.table.put(visited_key, value)
+        return value
+
+
+def solve(algorithm, instance, state_class=PortState, recorder=None, metrics=None, profiler=None):
+    """
+    Returns the states kept by the recorder (see recording.py), every minute by default.
+    The metric accumulators (see metrics.py), if any, are updated every minute after the decisions.
+    A Profiler (see profiling.py), if given, gets the time spent in each phase and the counters of the simulation.
+    """
+    port_state = state_class(instance)
+    if recorder is None:
+        recorder = FullRecorder()
+    if profiler:
+        port_state.profiler = profiler
+    else:
+        profiler = NullProfiler()
 
     max_time = max(v.departure_time for v in instance.vessels)
+    # policies that only score each barge's closest vessels (see NearestGreedyAlgorithm) only get those
+    nearest = getattr(algorithm, 'nearest', None)
 
     while port_state.time <= max_time:  # Simulate until the last vessel departs
-        states.append(port_state.to_dict())
-        assignments = port_state.get_possible_assignments()
+        with profiler.phase('record'):
+            recorder.record(port_state, port_state.time == max_time)
+        with profiler.phase('enumerate'):
+            assignments = port_state.get_possible_assignments(nearest)
 
         while assignments:
-            assignment_choice = algorithm.choose(assignments, port_state)
-            # print(f't={port_state.time} {assignment_choice}')
-            port_state.apply_assignment(
-                assignment_choice[0], assignment_choice[1])
-            assignments = port_state.get_possible_assignments()
+            profiler.count('candidates', len(assignments))
+            with profiler.phase('choose'):
+                if hasattr(algorithm, 'choose_many'):
+                    # several non-conflicting assignments from one call
+                    chosen = algorithm.choose_many(assignments, port_state)
+                else:
+                    chosen = [algorithm.choose(assignments, port_state)]
+            profiler.count('assignments', len(chosen))
+            with profiler.phase('apply'):
+                for barge_id, target in chosen:
+                    port_state.apply_assignment(barge_id, target)
+            with profiler.phase('enumerate'):
+                assignments = port_state.get_possible_assignments(nearest)
+
+        if metrics:
+            with profiler.phase('metrics'):
+                for metric in metrics:
+                    metric.update(port_state)
+
+        with profiler.phase('step'):
+            port_state.step()
+        profiler.count('ticks')
+
+    return recorder.states
+
 
-        port_state = port_state.advance_one_minute()
+GREEDY_FOLDER = 'solutions_greedy'
+RANDOM_FOLDER = 'solutions_random'
+BEAM_FOLDER = 'solutions_beam'
+MATCHING_FOLDER = 'solutions_matching'
+FOLDERS = {'greedy': GREEDY_FOLDER, 'random': RANDOM_FOLDER, 'beam': BEAM_FOLDER, 'matching': MATCHING_FOLDER}
+# the policy of each deterministic algorithm (random runs several seeds, see run_task)
+POLICIES = {'greedy': VectorizedGreedyAlgorithm, 'beam': BeamSearchAlgorithm, 'matching': MatchingAlgorithm}
+RANDOM_SEEDS = (0, 1, 2) # the random solution saved is the median of these runs
+# the code the results of each algorithm depend on, besides the simulation modules (and solve and run_task): its
+# modules, and its functions and classes of this file, so changing another algorithm doesn't make them stale
+ALGORITHM_CODE = {
+    'greedy': ([], [VectorizedGreedyAlgorithm, pair_arrays]),
+    'random': ([], [RandomAlgorithm]),
+    'beam': (['event_engine.py'], [BeamSearchAlgorithm, TranspositionTable, VectorizedGreedyAlgorithm, pair_arrays]),
+    'matching': (['matching.py'], [MatchingAlgorithm, pair_arrays]),
+}
+_algorithm_versions = {}
 
-    return states
 
+def algorithm_version(algorithm_name):
+    """
+    Returns the hash of the code the results of an algorithm depend on (see ALGORITHM_CODE).
+    """
+    if algorithm_name not in _algorithm_versions:
+        files, objects = ALGORITHM_CODE[algorithm_name]
+        _algorithm_versions[algorithm_name] = code_version(SIMULATION_FILES + files, objects + [solve, run_task])
+    return _algorithm_versions[algorithm_name]
 
-def main():
-    instances_folder = 'instances'
-    greedy_folder = 'solutions_greedy'
-    random_folder = 'solutions_random'
+
+def task_parameters(algorithm_name, recording='full', record_every=60, profile=False):
+    """
+    Returns the arguments of run_task that change what it saves, and the version of the code it runs, for the task
+    keys of the manifest.
+    """
+    parameters = {'recording': recording, 'profile': profile, 'code': algorithm_version(algorithm_name)}
+    if recording == 'sampled':
+        parameters['record_every'] = record_every
+    if algorithm_name == 'random':
+        parameters['seeds'] = list(RANDOM_SEEDS)
+    return parameters
+
+
+def run_task(instance_source, algorithm_name, recording='full', record_every=60, profile=False):
+    """
+    Solves one instance with one algorithm and saves the solution. Returns the time it took, the profiling
+    report of the task (None without `profile`), which is also saved next to the solution, and the saved filenames.
+    Tasks only depend on their arguments, so they give the same result in any process and in any order.
+    """
+    start_time = datetime.datetime.now()
+    instance_id, instance = load_instance(instance_source) # a JSON file or a row of the instance bank
+    solution_filename = f"solution_{instance_id}.npz"
+    summary_filename = f"summary_{instance_id}.json"
+    profiler = Profiler() if profile else NullProfiler()
+
+    folder = FOLDERS[algorithm_name]
+    if algorithm_name in POLICIES:
+        metrics = default_metrics()
+        states = solve(POLICIES[algorithm_name](), instance, recorder=make_recorder(recording, record_every), metrics=metrics, profiler=profiler)
+    else:
+        # 3 seeds, so we get 3 different solutions. Only their final states are needed to find the median
+        final_states = [solve(RandomAlgorithm(seed=seed), instance, recorder=FinalStateRecorder(), profiler=profiler)[-1] for seed in RANDOM_SEEDS]
+        delivered_demands = [sum(vessel['current_fuel_demand'] for vessel in s['vessels']) for s in final_states]
+        median_index = int(np.argsort(delivered_demands)[len(delivered_demands)//2])
+        # the seed makes the run reproducible, so the median one is simply run again to record it
+        metrics = default_metrics()
+        states = solve(RandomAlgorithm(seed=RANDOM_SEEDS[median_index]), instance, recorder=make_recorder(recording, record_every), metrics=metrics, profiler=profiler)
+
+    with profiler.phase('save'):
+        Trajectory.from_states(states).save(os.path.join(folder, solution_filename))
+        write_summary(os.path.join(folder, summary_filename), metrics)
+    filenames = [solution_filename, summary_filename]
+    report = None
+    if profiler:
+        report = profiler.report()
+        filenames.append(f"profile_{instance_id}.json")
+        write_report(os.path.join(folder, filenames[-1]), report)
+
+    return datetime.datetime.now() - start_time, report, filenames
+
+
+def main(workers=1, recording='full', record_every=60, profile=False, algorithms=('greedy', 'random'), force=False):
     # Ensure the output folder exists
-    os.makedirs(greedy_folder, exist_ok=True)
-    os.makedirs(random_folder, exist_ok=True)
-    
-    greedy_algo = GreedyAlgorithm()
-    random_algo = RandomAlgorithm()
+    for algorithm_name in algorithms:
+        os.makedirs(FOLDERS[algorithm_name], exist_ok=True)
 
     start_time = datetime.datetime.now()
 
-    for filename in sorted(os.listdir(instances_folder)):
-        if filename.endswith('.json'):
-            instance_path = os.path.join(instances_folder, filename)
-            instance_id = filename.split('_')[-1].split('.')[0]
-            solution_filename = f"solution_{instance_id}.pickle"
-
-            print(f"Running simulation for {filename}")
-            with open(instance_path) as file:
-                instance = ProblemInstance.from_json(json.load(file))
-            
-            states = solve(greedy_algo, instance)
-            with open(os.path.join(greedy_folder, solution_filename), 'wb') as solution_file:
-                pickle.dump(states, solution_file)
-            
-            random_solutions = []
-            for i in range(3):
-                random.seed(i) # so we get 3 different solutions
-                random_solutions.append(solve(random_algo, instance))
-            delivered_demands = [sum(vessel['current_fuel_demand'] for vessel in s[-1]['vessels']) for s in random_solutions]
-            median_index = np.argsort(delivered_demands)[len(delivered_demands)//2]
-            
-            with open(os.path.join(random_folder, solution_filename), 'wb') as solution_file:
-                pickle.dump(random_solutions[median_index], solution_file)
+    # one task per instance and algorithm, except the ones whose results are already saved by this version of the code
+    manifests = {algorithm_name: Manifest(FOLDERS[algorithm_name]) for algorithm_name in algorithms}
+    all_tasks = [] # (source, instance_id, algorithm_name), the ones already done too
+    tasks = []
+    keys = []
+    skipped = 0
+    for source in instance_sources():
+        instance_id, instance = load_instance(source)
+        for algorithm_name in algorithms:
+            all_tasks.append((source, instance_id, algorithm_name))
+            key = task_key(instance, algorithm_name, task_parameters(algorithm_name, recording, record_every, profile))
+            if not force and manifests[algorithm_name].is_done(instance_id, key):
+                skipped += 1
+                continue
+            tasks.append((source, algorithm_name))
+            keys.append((instance_id, key))
+    print(f"{len(tasks)} tasks to run, {skipped} already done")
+
+    # the time and report of each task, None if it failed
+    task_times = [None] * len(tasks)
+    reports = [None] * len(tasks)
+    def finished(i, task_time, report, filenames):
+        task_times[i] = task_time
+        reports[i] = report
+        manifests[tasks[i][1]].add(*keys[i], filenames, task_time.total_seconds())
+
+    def failed(i, error):
+        source, algorithm_name = tasks[i]
+        print(f"Failed {algorithm_name} simulation for {source_name(source)}: {error!r}")
+
+    # each result is added to the manifest as soon as its task finishes, whatever the order, and a failing task
+    # doesn't stop the others
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(run_task, *task, recording, record_every, profile): i for i, task in enumerate(tasks)}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        finished(i, *future.result())
+                    except Exception as error:
+                        failed(i, error)
+                        continue
+                    source, algorithm_name = tasks[i]
+                    print(f"Finished {algorithm_name} simulation for {source_name(source)}")
+        else:
+            for i, (source, algorithm_name) in enumerate(tasks):
+                print(f"Running {algorithm_name} simulation for {source_name(source)}")
+                try:
+                    finished(i, *run_task(source, algorithm_name, recording, record_every, profile))
+                except Exception as error:
+                    failed(i, error)
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
 
     end_time = datetime.datetime.now()
+    failed_tasks = {(keys[i][0], algorithm_name) for i, (_, algorithm_name) in enumerate(tasks) if task_times[i] is None}
+    if failed_tasks:
+        print(f"{len(failed_tasks)} tasks failed, they will run again next time")
+
+    def recorded_time(instance_id, algorithm_name):
+        # from the manifest, so the tasks done by an earlier run keep their time
+        if (instance_id, algorithm_name) in failed_tasks:
+            return 'failed'
+        seconds = manifests[algorithm_name].entries.get(instance_id, {}).get('seconds')
+        return 'unknown' if seconds is None else datetime.timedelta(seconds=seconds)
 
     with open("./times.txt", 'w') as times_file:
         times_file.write("\n".join([
             f"Started at {start_time}",
             f"Finished at {end_time}",
             f"Total runtime: {end_time - start_time}",
+            f"Workers: {workers}",
+            f"Tasks already done: {skipped}",
+            f"Tasks failed: {len(failed_tasks)}",
+            f"Total task time of this run: {sum((t for t in task_times if t is not None), datetime.timedelta())}",
+            "",
+            "Task times:",
+            *[f"{source_name(source)} {algorithm_name}: {recorded_time(instance_id, algorithm_name)}" for source, instance_id, algorithm_name in all_tasks],
         ]))
 
+    if profile:
+        # one report per algorithm, summed over the instances
+        for algorithm_name in algorithms:
+            # only the tasks run this time are in the report
+            report = merge_reports(r for (_, name), r in zip(tasks, reports) if name == algorithm_name and r is not None)
+            write_report(os.path.join(FOLDERS[algorithm_name], "profile.json"), report)
+            print(f"Profile of the {algorithm_name} tasks:")
+            print(format_report(report))
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help="number of processes solving instances in parallel")
+    parser.add_argument('--recording', choices=['full', 'sampled', 'events', 'final'], default='full', help="which minutes of each solution are saved")
+    parser.add_argument('--record-every', type=int, default=60, help="minutes between saved states with --recording sampled")
+    parser.add_argument('--profile', action='store_true', help="time the phases of every simulation and save the reports")
+    parser.add_argument('--algorithms', nargs='+', choices=list(FOLDERS), default=['greedy', 'random'], help="algorithms to run on every instance")
+    parser.add_argument('--force', action='store_true', help="run every task again, even the ones already done with the same code and parameters")
+    args = parser.parse_args()
+    main(workers=args.workers, recording=args.recording, record_every=args.record_every, profile=args.profile, algorithms=args.algorithms, force=args.force)
@@ -1,4 +1,4 @@
-import json
+from instance_features import load_features
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -11,43 +11,15 @@ def main():
     os.makedirs(charts_folder, exist_ok=True)
     sns.set(style="whitegrid")
     
-    # Data containers
-    vessel_counts = []
-    fuel_demands = []
-    peak_vessel_counts = []
-    vessel_timeline_records = []
-    
-    # Load and analyze instances
-    for file_name in os.listdir(instances_folder):
-        with open(os.path.join(instances_folder, file_name)) as json_file:
-            instance = json.load(json_file)
-    
-        vessels = instance["vessels"]
-        vessel_counts.append(len(vessels))
-        fuel_demands.append(sum(v["fuel_demand"]/1000 for v in vessels))
-    
-        if vessels:
-            max_departure = max(v["departure_time"] for v in vessels)
-        else:
-            max_departure = 0
-    
-        timeline = np.zeros(max_departure + 1, dtype=int)
-    
-        for vessel in vessels:
-            timeline[vessel["arrival_time"]:vessel["departure_time"]] += 1
-    
-        peak_vessel_counts.append(timeline.max())
-        vessel_timeline_records.append(timeline)
-    
-    # Normalize timelines
-    global_max_time = max(len(tl) for tl in vessel_timeline_records)
-    for i in range(len(vessel_timeline_records)):
-        pad_len = global_max_time - len(vessel_timeline_records[i])
-        if pad_len > 0:
-            vessel_timeline_records[i] = np.pad(vessel_timeline_records[i], (0, pad_len))
-    
-    vessel_timelines = np.array(vessel_timeline_records)
-    time_axis = np.arange(global_max_time)
+    # vessel counts, demands, peaks and occupancy curves of every instance, extracted once and cached (see instance_features.py)
+    features = load_features(instances_folder)
+    vessel_counts = features.num_vessels.tolist()
+    fuel_demands = (features.total_fuel_demand / 1000).tolist()
+    peak_vessel_counts = features.peak_vessels.tolist()
+    # mean and std of the vessels present at each minute, from the curves instead of a timeline per instance
+    mean_active, std_active = features.occupancy_moments()
+    time_axis = np.arange(len(mean_active))
+
     sns.set()
     sns.set_palette("bright")
     
@@ -64,10 +36,6 @@ def main():
     plt.close()
     
     # --- Chart 2: Active Vessels Over Time ---
-    mean_active = vessel_timelines.mean(axis=0)
-    # median_active = np.median(vessel_timelines, axis=0)
-    std_active = vessel_timelines.std(axis=0)
-    
     plt.figure(figsize=(8, 5))
     sns.lineplot(x=time_axis, y=mean_active, label="Mean")
     # sns.lineplot(x=time_axis, y=median_active, label="Median", color="orange")
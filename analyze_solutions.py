@@ -4,6 +4,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
+from trajectory import Trajectory
+from metrics import read_summary
+from instance_features import occupancy_curve, load_features
+from instance_bank import INSTANCES_FOLDER
+from algorithm import FOLDERS
     
 def get_delivered_fuel_percentage(state, total_demand):
     if total_demand == 0:
@@ -12,8 +17,49 @@ def get_delivered_fuel_percentage(state, total_demand):
     delivered_demand = total_demand - current_demand
     return delivered_demand / total_demand
 
+def get_trajectory_stats(solution_path):
+    # only the demand column and the static vessel times are read from the memory-mapped file
+    trajectory = Trajectory.load(solution_path)
+    demand = trajectory.current_fuel_demand
+    total_demand = trajectory.fuel_demand.sum()
+    if total_demand == 0:
+        delivered = np.ones(len(trajectory))
+    else:
+        delivered = (total_demand - demand.sum(axis=1)) / total_demand
+    # solutions recorded sparsely (sampled or event-only) hold each value until the next recorded minute
+    times = trajectory.time
+    max_departure = int(times[-1]) + 1
+    minutes = np.arange(max_departure)
+    delivered_over_time = list(delivered[np.maximum(np.searchsorted(times, minutes, side='right') - 1, 0)])
+
+    peak_vessel_count = occupancy_curve(trajectory.arrival_time, trajectory.departure_time)[1].max(initial=0)
+
+    return {
+        "max_departure": max_departure,
+        "peak_vessel_count": peak_vessel_count,
+        "delivered_over_time": delivered_over_time,
+        "total_delivery": delivered_over_time[-1] # -1 represent the last state of the list
+    }
+
+def get_summary_stats(summary_path):
+    # the summary written by algorithm.main already holds the metrics, so the solution itself isn't opened
+    summary = read_summary(summary_path)
+    delivered_over_time = summary["delivered_over_time"]
+    return {
+        "max_departure": len(delivered_over_time),
+        "peak_vessel_count": summary["peak_vessel_count"],
+        "delivered_over_time": delivered_over_time,
+        "total_delivery": delivered_over_time[-1]
+    }
+
 def get_stats(solution_path):
     print("Reading file", solution_path)
+    folder, filename = os.path.split(solution_path)
+    summary_path = os.path.join(folder, filename.replace('solution_', 'summary_').rsplit('.', 1)[0] + '.json')
+    if os.path.exists(summary_path):
+        return get_summary_stats(summary_path)
+    if solution_path.endswith('.npz'):
+        return get_trajectory_stats(solution_path)
     with open(solution_path, 'rb') as solution_file:
         solution = pickle.load(solution_file)
     initial_state = solution[0]
@@ -24,10 +70,8 @@ def get_stats(solution_path):
     
     max_departure = len(solution)
     
-    timeline = np.zeros(max_departure + 1, dtype=int)
-    for vessel in solution[0]['vessels']:
-        timeline[vessel["arrival_time"]:vessel["departure_time"]] += 1
-    peak_vessel_count = timeline.max()
+    vessels = solution[0]['vessels']
+    peak_vessel_count = occupancy_curve([v["arrival_time"] for v in vessels], [v["departure_time"] for v in vessels])[1].max(initial=0)
 
     return {
         "max_departure": max_departure,
@@ -37,13 +81,24 @@ def get_stats(solution_path):
     }
     
 
+def get_solution_files(folder):
+    # .npz trajectories, or the legacy pickles if the folder wasn't converted
+    files = sorted(file for file in os.listdir(folder) if file.endswith('.npz'))
+    return files or sorted(file for file in os.listdir(folder) if file.endswith('.pickle'))
+
 def main():
     # Configuration
-    greedy_folder = "solutions_greedy"
-    random_folder = "solutions_random"
-    
-    greedy_stats = [get_stats(os.path.join(greedy_folder, file)) for file in os.listdir(greedy_folder)]
-    random_stats = [get_stats(os.path.join(random_folder, file)) for file in os.listdir(random_folder)]
+    greedy_folder = FOLDERS['greedy']
+    random_folder = FOLDERS['random']
+    # optional, from algorithm.py --algorithms ...: (name, folder, label, color) of every other algorithm
+    labels = {'beam': "Beam search"}
+    other_names = [name for name in FOLDERS if name not in ('greedy', 'random')]
+    other_algorithms = [(name, FOLDERS[name], labels.get(name, name.capitalize()), f"C{2 + i}") for i, name in enumerate(other_names)]
+    
+    greedy_stats = [get_stats(os.path.join(greedy_folder, file)) for file in get_solution_files(greedy_folder)]
+    random_stats = [get_stats(os.path.join(random_folder, file)) for file in get_solution_files(random_folder)]
+    other_stats = {name: [get_stats(os.path.join(folder, file)) for file in get_solution_files(folder)] if os.path.isdir(folder) else []
+                   for name, folder, _, _ in other_algorithms}
     
     sns.set()
     sns.set_palette("bright")
@@ -52,6 +107,12 @@ def main():
     
     max_departures = [s['max_departure']/60 for s in greedy_stats]
     peak_vessel_counts = [s['peak_vessel_count'] for s in greedy_stats]
+    if os.path.isdir(INSTANCES_FOLDER) or os.path.exists(INSTANCES_FOLDER + '.npz'):
+        # the cached instance features already have the peaks, by the instance id of each solution_XXXX file
+        features = load_features(INSTANCES_FOLDER)
+        peaks = dict(zip(features.instance_id.tolist(), features.peak_vessels.tolist()))
+        solution_ids = [int(file.split('_')[-1].split('.')[0]) for file in get_solution_files(greedy_folder)]
+        peak_vessel_counts = [peaks.get(i, peak) for i, peak in zip(solution_ids, peak_vessel_counts)]
     
     delivered_df = pd.DataFrame([{"minute": minute, "delivered":100*delivered, "instance_id": instance_id} for (instance_id, s) in enumerate(greedy_stats) for (minute, delivered) in enumerate(s['delivered_over_time'])])
     delivered_random = pd.DataFrame([{"minute": minute, "delivered":100*delivered, "instance_id": instance_id} for (instance_id, s) in enumerate(random_stats) for (minute, delivered) in enumerate(s['delivered_over_time'])])
@@ -121,6 +182,32 @@ def main():
     plt.tight_layout()
     plt.savefig(os.path.join(results_dir, 'delivery_over_time_vs_random.pdf'))
     
+    for name, _, label, color in other_algorithms:
+        if not other_stats[name]:
+            continue
+        total_deliveries = [100*s['total_delivery'] for s in other_stats[name]]
+        delivered_other = pd.DataFrame([{"minute": minute, "delivered":100*delivered, "instance_id": instance_id} for (instance_id, s) in enumerate(other_stats[name]) for (minute, delivered) in enumerate(s['delivered_over_time'])])
+        print(f"Mean delivered fuel: greedy {np.mean(greedy_total_deliveries):.2f}%, {label.lower()} {np.mean(total_deliveries):.2f}%")
+
+        plt.figure(figsize=(10, 4))
+        plt.hist(greedy_total_deliveries, bins=20, label="Greedy")
+        plt.hist(total_deliveries, bins=20, color=color, label=label, alpha=0.5)
+        plt.title('Distribution of Delivered Fuel (%)')
+        plt.xlabel('Delivered Fuel (%)')
+        plt.ylabel('Number of Instances')
+        plt.tight_layout()
+        plt.legend(loc='lower right')
+        plt.savefig(os.path.join(results_dir, f'total_delivered_fuel_vs_{name}.pdf'))
+
+        plt.figure(figsize=(10, 4))
+        sns.lineplot(data=delivered_df, x='minute', y='delivered', errorbar="sd", label="Greedy")
+        sns.lineplot(data=delivered_other, x='minute', y='delivered', errorbar="sd", color=color, label=label)
+        plt.title('Delivered Fuel (%) Per Minute')
+        plt.xlabel('Time (min)')
+        plt.ylabel('Delivered Fuel (%)')
+        plt.tight_layout()
+        plt.savefig(os.path.join(results_dir, f'delivery_over_time_vs_{name}.pdf'))
+    
     ranges = [(0,25), (25,50), (50,75), (75, 100)]
     latex_table = []
     latex_table.append("\\begin{table}[htb]")
@@ -0,0 +1,303 @@
+from port_state import *
+import numpy as np
+
+# Action codes. A barge always runs the same sequence: GO -> SETUP_INIT -> FUEL (or REFUEL at the ORIGIN) -> SETUP_END,
+# so its whole action queue is given by its current action and its target.
+# The codes are the ActionType values, with 0 for IDLE.
+IDLE = 0
+GO, SETUP_INIT, FUEL, REFUEL, SETUP_END = ActionType
+ACTION_NAMES = ['IDLE', 'GO', 'SETUP_INIT', 'FUEL', 'REFUEL', 'SETUP_END']
+NEXT_ACTION = np.array([IDLE, SETUP_INIT, FUEL, SETUP_END, SETUP_END, IDLE]) # FUEL is replaced by REFUEL at the ORIGIN
+
+# Targets are vessel indexes, or one of these
+NO_TARGET = -1
+ORIGIN_TARGET = -2
+
+
+def advance_barges(s, time, tide_speed):
+    """
+    Advances every barge of `s` by one minute, in place, with the same arithmetic as PortState.advance_barge.
+    The arrays may have leading axes (e.g. the instance axis in batch_simulation), as long as the
+    per-instance values (tide_speed, flow rate and setup times) broadcast against them.
+    """
+    action = s.action
+    flow = np.broadcast_to(s.fuel_flow_rate_per_minute, action.shape)
+    vessel_setup_time = np.broadcast_to(s.vessel_setup_time, action.shape)
+    at_origin = s.target == ORIGIN_TARGET
+
+    # GO
+    going = action == GO
+    distance_remaining = s.go_target - s.location
+    direction = np.where(distance_remaining > 0, 1, -1)
+    total_speed_knots = barge_speed_knots(direction, s.current_fuel, s.base_move_speed_knots, s.move_speed_per_ton, tide_speed)
+    movement = direction * np.minimum(np.abs(distance_remaining), np.abs(total_speed_knots * 1852 / 60))
+    s.location = np.where(going, s.location + movement, s.location)
+    arrived = going & (np.abs(s.location - s.go_target) < 1e-6)
+    s.location = np.where(arrived, s.go_target, s.location)
+
+    # SETUP_INIT and SETUP_END (progress 0 means no setup running)
+    setup_time = np.where(at_origin, s.origin_setup_time, vessel_setup_time)
+    setup_finished = np.zeros(action.shape, dtype=bool)
+    for code, progress_attr in [(SETUP_INIT, 'setup_init_progress'), (SETUP_END, 'setup_end_progress')]:
+        in_setup = action == code
+        progress = getattr(s, progress_attr)
+        finished = in_setup & (progress > 0) & (progress + 1 >= setup_time)
+        setattr(s, progress_attr, np.where(finished, 0, np.where(in_setup, progress + 1, progress)))
+        setup_finished |= finished
+
+    # REFUEL
+    refueling = action == REFUEL
+    s.current_fuel = np.where(refueling, np.minimum(s.fuel_capacity, s.current_fuel + flow), s.current_fuel)
+    refueled = refueling & (s.current_fuel >= s.fuel_capacity)
+
+    # FUEL: each vessel is served by one barge at most, so the transfers never collide
+    fueling = np.nonzero(action == FUEL)
+    fueled = np.zeros(action.shape, dtype=bool)
+    if len(fueling[0]):
+        vessel_index = fueling[:-1] + (s.target[fueling],)
+        barge_fuel = s.current_fuel[fueling]
+        demand = s.current_fuel_demand[vessel_index]
+        transferred = np.minimum(np.minimum(flow[fueling], demand), barge_fuel)
+        s.current_fuel[fueling] = barge_fuel - transferred
+        s.current_fuel_demand[vessel_index] = demand - transferred
+        fueled[fueling] = (demand - transferred <= 0) | (barge_fuel - transferred <= 0) | \
+            (s.departure_time[vessel_index] - 1 <= time + vessel_setup_time[fueling])
+
+    # Move the finished actions to the next one in the sequence
+    done = arrived | setup_finished | refueled | fueled
+    next_action = NEXT_ACTION[action]
+    next_action = np.where((next_action == FUEL) & at_origin, REFUEL, next_action)
+    s.target = np.where(done & (action == SETUP_END), NO_TARGET, s.target)
+    s.action = np.where(done, next_action, action)
+
+
+class BargeStateView:
+    """
+    Reads one barge of an ArrayPortState with the attributes of a BargeState, so algorithms don't see a difference.
+    """
+    def __init__(self, state, index):
+        self.state = state
+        self.index = index
+        self.barge = state.problem_instance.barges[index]
+
+    @property
+    def location(self):
+        return self.state.location[self.index].item()
+
+    @property
+    def current_fuel(self):
+        return self.state.current_fuel[self.index].item()
+
+    @property
+    def current_vessel_id(self):
+        target = self.state.target[self.index]
+        if target == NO_TARGET:
+            return None
+        if target == ORIGIN_TARGET:
+            return 'ORIGIN'
+        return self.state.problem_instance.vessels[target].id
+
+    @property
+    def setup_init_progress(self):
+        return self.state.setup_init_progress[self.index].item() or None
+
+    @property
+    def setup_end_progress(self):
+        return self.state.setup_end_progress[self.index].item() or None
+
+    @property
+    def action_queue(self):
+        action = self.state.action[self.index]
+        if action == IDLE:
+            return deque()
+        target = self.current_vessel_id
+        if target == 'ORIGIN':
+            queue = [Action(GO, 0), Action(SETUP_INIT, ORIGIN_ID), Action(REFUEL), Action(SETUP_END, ORIGIN_ID)]
+        else:
+            position = self.state.problem_instance.vessels[self.state.target[self.index]].get_position()
+            queue = [Action(GO, position), Action(SETUP_INIT, target), Action(FUEL, target), Action(SETUP_END, target)]
+        return deque(queue[[GO, SETUP_INIT, FUEL, SETUP_END].index(FUEL if action == REFUEL else action):])
+
+    def get_speed_knots(self, direction, tide_speed):
+        return barge_speed_knots(direction, self.current_fuel, self.barge.base_move_speed_knots, self.barge.move_speed_per_ton, tide_speed)
+
+
+class VesselStateView:
+    """
+    Reads one vessel of an ArrayPortState with the attributes of a VesselState.
+    """
+    def __init__(self, state, index):
+        self.state = state
+        self.index = index
+        self.vessel = state.problem_instance.vessels[index]
+
+    @property
+    def current_fuel_demand(self):
+        return self.state.current_fuel_demand[self.index].item()
+
+
+class ArrayPortState:
+    """
+    Struct-of-arrays version of PortState: every barge and vessel attribute is a NumPy array, and a minute of the
+    whole fleet is a handful of vectorized operations. It has the same methods as PortState, and `barge_states`
+    and `vessel_states` give BargeState/VesselState-like views, so the algorithms work with both.
+    """
+    profiler = None # like PortState.profiler; completed actions aren't counted by type here
+
+    def __init__(self, problem_instance: ProblemInstance):
+        barges = problem_instance.barges
+        vessels = problem_instance.vessels
+        self.time = 0
+        self.event_count = 0 # assignments and completed actions so far, like PortState.event_count
+        self.problem_instance = problem_instance
+        self.fuel_flow_rate_per_minute = problem_instance.fuel_flow_rate_per_minute
+        self.origin_setup_time = problem_instance.origin_setup_time
+        self.vessel_setup_time = problem_instance.vessel_setup_time
+        self.barge_index = {b.id: i for i, b in enumerate(barges)}
+        self.vessel_index = {v.id: i for i, v in enumerate(vessels)}
+
+        # Barges
+        self.fuel_capacity = np.array([b.fuel_capacity for b in barges], dtype=float)
+        self.min_fuel = np.array([b.min_fuel for b in barges], dtype=float)
+        self.base_move_speed_knots = np.array([b.base_move_speed_knots for b in barges], dtype=float)
+        self.move_speed_per_ton = np.array([b.move_speed_per_ton for b in barges], dtype=float)
+        self.location = np.zeros(len(barges)) # Initially, the barges start on the Origin Point (0)
+        self.current_fuel = self.fuel_capacity.copy() # with their total capacity fuel
+        self.action = np.full(len(barges), IDLE)
+        self.target = np.full(len(barges), NO_TARGET)
+        self.go_target = np.zeros(len(barges))
+        self.setup_init_progress = np.zeros(len(barges), dtype=int)
+        self.setup_end_progress = np.zeros(len(barges), dtype=int)
+
+        # Vessels
+        self.position = np.array([v.get_position() for v in vessels], dtype=float)
+        self.arrival_time = np.array([v.arrival_time for v in vessels], dtype=int)
+        self.departure_time = np.array([v.departure_time for v in vessels], dtype=int)
+        self.current_fuel_demand = np.array([v.fuel_demand for v in vessels], dtype=float)
+
+        self.barge_states = [BargeStateView(self, i) for i in range(len(barges))]
+        self.vessel_states = [VesselStateView(self, i) for i in range(len(vessels))]
+
+    @staticmethod
+    def from_port_state(port_state: PortState):
+        state = ArrayPortState(port_state.problem_instance)
+        state.time = port_state.time
+        for i, barge_state in enumerate(port_state.barge_states):
+            state.location[i] = barge_state.location
+            state.current_fuel[i] = barge_state.current_fuel
+            state.setup_init_progress[i] = barge_state.setup_init_progress or 0
+            state.setup_end_progress[i] = barge_state.setup_end_progress or 0
+            if barge_state.current_vessel_id is not None:
+                state.target[i] = ORIGIN_TARGET if barge_state.current_vessel_id == 'ORIGIN' else state.vessel_index[barge_state.current_vessel_id]
+            if barge_state.action_queue:
+                state.action[i] = barge_state.action_queue[0].opcode
+                state.go_target[i] = 0 if state.target[i] == ORIGIN_TARGET else state.position[state.target[i]]
+        for i, vessel_state in enumerate(port_state.vessel_states):
+            state.current_fuel_demand[i] = vessel_state.current_fuel_demand
+        return state
+
+    def to_port_state(self):
+        port_state = PortState(self.problem_instance)
+        port_state.time = self.time
+        for barge_state, view in zip(port_state.barge_states, self.barge_states):
+            barge_state.location = view.location
+            barge_state.current_fuel = view.current_fuel
+            barge_state.current_vessel_id = view.current_vessel_id
+            barge_state.setup_init_progress = view.setup_init_progress
+            barge_state.setup_end_progress = view.setup_end_progress
+            barge_state.action_queue = view.action_queue
+        for vessel_state, view in zip(port_state.vessel_states, self.vessel_states):
+            vessel_state.current_fuel_demand = view.current_fuel_demand
+        port_state.reindex()
+        return port_state
+
+    def get_barge_state(self, barge_id):
+        return self.barge_states[self.barge_index[barge_id]]
+
+    def get_vessel_state(self, vessel_id):
+        return self.vessel_states[self.vessel_index[vessel_id]]
+
+    def clone(self):
+        if self.profiler:
+            self.profiler.count('clones')
+        clone = ArrayPortState.__new__(ArrayPortState)
+        clone.__dict__.update({k: v.copy() if isinstance(v, np.ndarray) else v for k, v in self.__dict__.items()})
+        clone.barge_states = [BargeStateView(clone, i) for i in range(len(self.barge_states))]
+        clone.vessel_states = [VesselStateView(clone, i) for i in range(len(self.vessel_states))]
+        return clone
+
+    def get_possible_assignments(self, nearest=None):
+        # same rules (and order) as PortState.get_possible_assignments. There is no position index here, so `nearest`
+        # is ignored and every waiting vessel is a candidate
+        free = self.action == IDLE
+        origin_locked = np.any(self.target == ORIGIN_TARGET)
+        locked = np.zeros(len(self.vessel_states), dtype=bool)
+        locked[self.target[self.target >= 0]] = True
+        available = ~locked & (self.current_fuel_demand > 0) \
+            & (self.arrival_time <= self.time) & (self.time < self.departure_time) \
+            & (self.departure_time - self.time >= 2 * self.vessel_setup_time)
+        vessel_ids = [self.problem_instance.vessels[v].id for v in np.flatnonzero(available)]
+
+        assignments = []
+        for b in np.flatnonzero(free):
+            barge_id = self.problem_instance.barges[b].id
+            if self.current_fuel[b] < self.min_fuel[b]:
+                if not origin_locked:
+                    assignments.append((barge_id, 'ORIGIN'))
+                continue
+            assignments.extend((barge_id, vessel_id) for vessel_id in vessel_ids)
+        return assignments
+
+    def apply_assignment(self, barge_id, target):
+        b = self.barge_index[barge_id]
+        if target == 'ORIGIN':
+            self.target[b] = ORIGIN_TARGET
+            self.go_target[b] = 0
+        else:
+            self.target[b] = self.vessel_index[target]
+            self.go_target[b] = self.position[self.target[b]]
+        self.action[b] = GO
+        self.event_count += 1
+
+    def step(self):
+        previous_action = self.action
+        advance_barges(self, self.time, self.problem_instance.get_tide_speed_at(self.time))
+        self.event_count += np.count_nonzero(previous_action != self.action)
+        self.time += 1
+        return self
+
+    def advance_one_minute(self):
+        return self.clone().step()
+
+    def to_dict(self):
+        tide_speed = self.problem_instance.get_tide_speed_at(self.time)
+        speeds = barge_speed_knots(1, self.current_fuel, self.base_move_speed_knots, self.move_speed_per_ton, tide_speed)
+        return {
+            "time": self.time,
+            "tide_speed": tide_speed,
+            "barges": [
+                {
+                    "id": b.barge.id,
+                    "location": b.location,
+                    "current_fuel": b.current_fuel,
+                    "fuel_capacity": b.barge.fuel_capacity,
+                    "current_vessel_id": b.current_vessel_id,
+                    "setup_init_progress": b.setup_init_progress,
+                    "setup_end_progress": b.setup_end_progress,
+                    "action_queue": [str(a) for a in b.action_queue],
+                    "speed": speeds[b.index].item()
+                }
+                for b in self.barge_states
+            ],
+            "vessels": [
+                {
+                    "id": v.vessel.id,
+                    "position": v.vessel.get_position(),
+                    "current_fuel_demand": v.current_fuel_demand,
+                    "fuel_demand": v.vessel.fuel_demand,
+                    "arrival_time": v.vessel.arrival_time,
+                    "departure_time": v.vessel.departure_time
+                }
+                for v in self.vessel_states
+            ]
+        }
@@ -0,0 +1,197 @@
+from array_state import *
+from instance_bank import instance_sources, load_instance
+import datetime
+
+# Attributes of BatchPortState that have the instance axis first
+BATCH_ATTRIBUTES = [
+    'instance_ids', 'max_time', 'barge_mask', 'vessel_mask',
+    'fuel_flow_rate_per_minute', 'origin_setup_time', 'vessel_setup_time', 'tide_group',
+    'fuel_capacity', 'min_fuel', 'base_move_speed_knots', 'move_speed_per_ton',
+    'location', 'current_fuel', 'action', 'target', 'go_target', 'setup_init_progress', 'setup_end_progress',
+    'position', 'fuel_demand', 'arrival_time', 'departure_time', 'current_fuel_demand',
+]
+
+
+class BatchPortState:
+    """
+    The port state of many instances at once, as (instance, barge) and (instance, vessel) arrays padded to the
+    largest fleet. Padded barges are always IDLE and padded vessels never arrive, so they never take part.
+    All instances share the clock; the ones past their last departure are dropped by `compact`.
+    """
+    def __init__(self, instances: List[ProblemInstance]):
+        n = len(instances)
+        num_barges = max(len(i.barges) for i in instances)
+        num_vessels = max(len(i.vessels) for i in instances)
+        self.time = 0
+        self.instances = instances
+        self.instance_ids = np.arange(n)
+        self.max_time = np.array([max(v.departure_time for v in i.vessels) for i in instances])
+
+        def padded(rows, width, fill, dtype=float):
+            array = np.full((n, width), fill, dtype=dtype)
+            for i, row in enumerate(rows):
+                array[i, :len(row)] = row
+            return array
+
+        self.barge_mask = padded([[True] * len(i.barges) for i in instances], num_barges, False, bool)
+        self.vessel_mask = padded([[True] * len(i.vessels) for i in instances], num_vessels, False, bool)
+
+        # Per-instance parameters, as columns so they broadcast against the barges
+        self.fuel_flow_rate_per_minute = np.array([[i.fuel_flow_rate_per_minute] for i in instances], dtype=float)
+        self.origin_setup_time = np.array([[i.origin_setup_time] for i in instances])
+        self.vessel_setup_time = np.array([[i.vessel_setup_time] for i in instances])
+        # the tide is only looked up once per distinct (amplitude, period)
+        tides = {}
+        for i in instances:
+            tides.setdefault((i.tide_amplitude, i.tide_period), i)
+        self.tide_instances = list(tides.values())
+        self.tide_group = np.array([[list(tides).index((i.tide_amplitude, i.tide_period))] for i in instances])
+
+        # Barges
+        self.fuel_capacity = padded([[b.fuel_capacity for b in i.barges] for i in instances], num_barges, 0)
+        self.min_fuel = padded([[b.min_fuel for b in i.barges] for i in instances], num_barges, 0)
+        self.base_move_speed_knots = padded([[b.base_move_speed_knots for b in i.barges] for i in instances], num_barges, 0)
+        self.move_speed_per_ton = padded([[b.move_speed_per_ton for b in i.barges] for i in instances], num_barges, 0)
+        self.location = np.zeros((n, num_barges))
+        self.current_fuel = self.fuel_capacity.copy()
+        self.action = np.full((n, num_barges), IDLE)
+        self.target = np.full((n, num_barges), NO_TARGET)
+        self.go_target = np.zeros((n, num_barges))
+        self.setup_init_progress = np.zeros((n, num_barges), dtype=int)
+        self.setup_end_progress = np.zeros((n, num_barges), dtype=int)
+
+        # Vessels
+        self.position = padded([[v.get_position() for v in i.vessels] for i in instances], num_vessels, 0)
+        self.fuel_demand = padded([[v.fuel_demand for v in i.vessels] for i in instances], num_vessels, 0)
+        self.arrival_time = padded([[v.arrival_time for v in i.vessels] for i in instances], num_vessels, np.iinfo(int).max, int)
+        self.departure_time = padded([[v.departure_time for v in i.vessels] for i in instances], num_vessels, 0, int)
+        self.current_fuel_demand = self.fuel_demand.copy()
+
+    def get_tide_speed(self):
+        tides = np.array([i.get_tide_speed_at(self.time) for i in self.tide_instances])
+        return tides[self.tide_group]
+
+    def step(self):
+        advance_barges(self, self.time, self.get_tide_speed())
+        self.time += 1
+        return self
+
+    def compact(self, keep):
+        """
+        Drops the instances (rows) that are not in the `keep` mask.
+        """
+        for attribute in BATCH_ATTRIBUTES:
+            setattr(self, attribute, getattr(self, attribute)[keep])
+
+
+class BatchGreedyAlgorithm:
+    """
+    GreedyAlgorithm applied to every instance of a BatchPortState at once. Each round commits, in every instance,
+    the assignment GreedyAlgorithm would choose next, until no instance has anything left to assign.
+    """
+    def assign(self, state: BatchPortState):
+        n = len(state.instance_ids)
+        rows = np.arange(n)
+        free = state.barge_mask & (state.action == IDLE)
+        low_fuel = free & (state.current_fuel < state.min_fuel)
+
+        # A barge that must go to the ORIGIN doesn't compete: the first one goes, if the ORIGIN is free
+        origin_free = ~np.any(state.target == ORIGIN_TARGET, axis=1)
+        to_origin = origin_free & np.any(low_fuel, axis=1)
+        first_low = np.argmax(low_fuel, axis=1)[to_origin]
+        state.target[to_origin, first_low] = ORIGIN_TARGET
+        state.go_target[to_origin, first_low] = 0
+        state.action[to_origin, first_low] = GO
+
+        # Candidate (barge, vessel) pairs, with the same rules as PortState.get_possible_assignments
+        locked = np.zeros(state.current_fuel_demand.shape, dtype=bool)
+        busy = np.nonzero(state.target >= 0)
+        locked[busy[0], state.target[busy]] = True
+        available = state.vessel_mask & ~locked & (state.current_fuel_demand > 0) \
+            & (state.arrival_time <= state.time) & (state.time < state.departure_time) \
+            & (state.departure_time - state.time >= 2 * state.vessel_setup_time)
+        candidates = (free & ~low_fuel)[:, :, None] & available[:, None, :]
+        if not candidates.any():
+            return
+
+        # The greedy score, as one array per criterion, compared lexicographically
+        fuel = state.current_fuel[:, :, None]
+        demand = state.current_fuel_demand[:, None, :]
+        can_fully_supply = fuel >= demand
+        scores = [
+            np.broadcast_to(demand / np.maximum(state.departure_time - state.time, 1)[:, None, :], candidates.shape),
+            np.broadcast_to(can_fully_supply, candidates.shape).astype(int),
+            np.where(can_fully_supply, 0, fuel),
+            -np.abs(state.location[:, :, None] - state.position[:, None, :]),
+        ]
+
+        while candidates.any():
+            best = candidates.copy()
+            for score in scores:
+                masked = np.where(best, score, -np.inf)
+                best &= masked == masked.max(axis=(1, 2), keepdims=True)
+            # ties go to the first pair, in the order of get_possible_assignments (barges first)
+            choice = np.argmax(best.reshape(n, -1), axis=1)
+            has_choice = candidates.any(axis=(1, 2))
+            barge, vessel = np.divmod(choice[has_choice], candidates.shape[2])
+            chosen = rows[has_choice]
+            state.target[chosen, barge] = vessel
+            state.go_target[chosen, barge] = state.position[chosen, vessel]
+            state.action[chosen, barge] = GO
+            candidates[chosen, barge, :] = False
+            candidates[chosen, :, vessel] = False
+
+
+class BatchSimulation:
+    """
+    Simulates many instances in lockstep, one minute per step for all of them.
+    """
+    def __init__(self, instances: List[ProblemInstance]):
+        self.state = BatchPortState(instances)
+        self.remaining_demand = [[] for _ in instances] # total remaining demand per minute, per instance
+        self.results = [None] * len(instances)
+
+    def finish(self, finished):
+        state = self.state
+        for row in np.flatnonzero(finished):
+            instance_id = state.instance_ids[row]
+            num_barges = state.barge_mask[row].sum()
+            num_vessels = state.vessel_mask[row].sum()
+            self.results[instance_id] = {
+                "time": state.time - 1,
+                "remaining_demand_over_time": np.array(self.remaining_demand[instance_id]),
+                "current_fuel_demand": state.current_fuel_demand[row, :num_vessels].copy(),
+                "current_fuel": state.current_fuel[row, :num_barges].copy(),
+                "location": state.location[row, :num_barges].copy(),
+            }
+        state.compact(~finished)
+
+    def run(self, algorithm):
+        state = self.state
+        while len(state.instance_ids):
+            # like solve, the state of each minute is recorded before its decisions
+            for instance_id, demand in zip(state.instance_ids, state.current_fuel_demand.sum(axis=1)):
+                self.remaining_demand[instance_id].append(demand)
+            algorithm.assign(state)
+            state.step()
+            finished = state.max_time < state.time
+            if finished.any():
+                self.finish(finished)
+        return self.results
+
+
+def main():
+    # from the instance bank if it's up to date, else from the JSON files
+    instances = [load_instance(source)[1] for source in instance_sources()]
+
+    start_time = datetime.datetime.now()
+    results = BatchSimulation(instances).run(BatchGreedyAlgorithm())
+    end_time = datetime.datetime.now()
+
+    deliveries = [1 - r["current_fuel_demand"].sum() / sum(v.fuel_demand for v in i.vessels) for i, r in zip(instances, results)]
+    print(f"Simulated {len(instances)} instances in {end_time - start_time}")
+    print(f"Mean delivered fuel: {100 * np.mean(deliveries):.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from problem_instance import ProblemInstance
+from port_state import PortState
+from algorithm import GreedyAlgorithm, solve
+from recording import FinalStateRecorder
+from generate_instances import TIERS
+import numpy as np
+import tracemalloc
+import argparse
+import platform
+import datetime
+import time
+import json
+import sys
+
+# Number of generated instances per tier, and of calls timed per operation
+TIER_INSTANCES = {'small': 20, 'default': 10, 'large': 3, 'huge': 1}
+CALLS = 200
+REPEATS = 5
+
+
+def time_calls(function, make_arguments):
+    """
+    Calls `function` on every element of `make_arguments()` and returns the mean time per call, in seconds.
+    The best of REPEATS runs is kept, as the slower ones only measure noise from the rest of the machine.
+    """
+    times = []
+    for _ in range(REPEATS):
+        arguments = make_arguments()
+        start = time.perf_counter()
+        for argument in arguments:
+            function(argument)
+        times.append((time.perf_counter() - start) / len(arguments))
+    return min(times)
+
+
+def decision_state(instance):
+    """
+    Returns the state of the first minute with assignments to choose from after a quarter of the simulation,
+    as solve with GreedyAlgorithm would reach it (or None if there is no such minute).
+    """
+    algorithm = GreedyAlgorithm()
+    state = PortState(instance)
+    max_time = max(v.departure_time for v in instance.vessels)
+    while state.time <= max_time:
+        assignments = state.get_possible_assignments()
+        if assignments and state.time >= max_time // 4:
+            return state
+        while assignments:
+            state.apply_assignment(*algorithm.choose(assignments, state))
+            assignments = state.get_possible_assignments()
+        state.step()
+    return None
+
+
+def benchmark_operations(instance):
+    """
+    Mean seconds per call of the PortState operations and GreedyAlgorithm.choose, on a state with choices to make.
+    """
+    state = decision_state(instance)
+    if state is None:
+        return {}
+    assignments = state.get_possible_assignments()
+    algorithm = GreedyAlgorithm()
+    same_state = lambda: [state] * CALLS
+    clones = lambda: [state.clone() for _ in range(CALLS)] # apply_assignment changes the state
+    return {
+        'advance_one_minute_seconds': time_calls(lambda s: s.advance_one_minute(), same_state),
+        'get_possible_assignments_seconds': time_calls(lambda s: s.get_possible_assignments(), same_state),
+        'apply_assignment_seconds': time_calls(lambda s: s.apply_assignment(*assignments[0]), clones),
+        'choose_seconds': time_calls(lambda s: algorithm.choose(assignments, s), same_state),
+    }
+
+
+def benchmark_tier(tier, count=None):
+    """
+    Returns the benchmark results of one tier, averaged over its generated instances (seeded, so always the same ones).
+    """
+    count = count or TIER_INSTANCES[tier]
+    instances = [ProblemInstance.generate_scaled(np.random.default_rng(i), **TIERS[tier]) for i in range(count)]
+    minutes = sum(max(v.departure_time for v in i.vessels) + 1 for i in instances)
+
+    solve_time = count * time_calls(lambda instance: solve(GreedyAlgorithm(), instance, recorder=FinalStateRecorder()), lambda: instances)
+
+    # traced separately, as tracemalloc slows everything down
+    tracemalloc.start()
+    solve(GreedyAlgorithm(), instances[0], recorder=FinalStateRecorder())
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    operations = [benchmark_operations(instance) for instance in instances]
+    operations = [o for o in operations if o]
+    return {
+        'instances': count,
+        'simulated_minutes': minutes,
+        'solve_seconds': solve_time,
+        'minutes_per_second': minutes / solve_time,
+        'instances_per_second': count / solve_time,
+        'solve_peak_bytes': peak_bytes, # of the simulation itself, without recorded states
+        **{name: float(np.mean([o[name] for o in operations])) for name in (operations[0] if operations else [])},
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the regressions of `results` against `baseline`: the measures more than `threshold` (a fraction)
+    slower (seconds, bytes) or with less throughput (per second) than the baseline.
+    """
+    regressions = []
+    for tier, measures in results['tiers'].items():
+        for name, value in measures.items():
+            base = baseline['tiers'].get(tier, {}).get(name)
+            if base is None or not base:
+                continue
+            if name.endswith('_per_second'):
+                change = base / value - 1 # throughput: lower is worse
+            elif name.endswith('_seconds') or name.endswith('_bytes'):
+                change = value / base - 1
+            else:
+                continue
+            if change > threshold:
+                regressions.append((tier, name, base, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=['small', 'default', 'large'])
+    parser.add_argument('--instances', type=int, default=None, help="instances per tier (default: depends on the tier)")
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None, help="baseline results to flag regressions against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="fraction of slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = {
+        'date': str(datetime.datetime.now()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tiers': {},
+    }
+    for tier in args.tiers:
+        print(f"Benchmarking tier {tier}")
+        results['tiers'][tier] = benchmark_tier(tier, args.instances)
+        for name, value in results['tiers'][tier].items():
+            print(f"    {name}: {value:.6g}")
+    with open(args.output, 'w') as results_file:
+        json.dump(results, results_file, indent=4)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for tier, name, base, value, change in regressions:
+            print(f"REGRESSION {tier} {name}: {base:.6g} -> {value:.6g} ({100 * change:+.1f}%)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+import zipfile
+import struct
+
+
+def open_npz(path, mmap_mode='r'):
+    """
+    Opens every array of an uncompressed .npz file (as written by np.savez) as a memory map, so reading one column,
+    or one row of it, doesn't load the whole file.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and can't be memory-mapped")
+            # the .npy data starts after the local file header, whose name and extra fields have variable lengths
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            name = info.filename.removesuffix('.npy')
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+class ColumnTable:
+    """
+    Named arrays, read as attributes, saved as one .npz file. Its length is the length of the LENGTH_COLUMN.
+    """
+    LENGTH_COLUMN = None
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.columns[self.LENGTH_COLUMN])
+
+    def save(self, path):
+        np.savez(path, **self.columns) # uncompressed, so it can be memory-mapped
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        if mmap:
+            return cls(open_npz(path))
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
@@ -1,53 +1,134 @@
-import matplotlib.pyplot as plt
-from problem_instance import ProblemInstance
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from instance_bank import instance_sources, json_files, load_instance, source_digest, source_id, source_name
+from result_cache import Manifest, code_version
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
 import os
-import json
 
 # To visualize the instances
 
-def plot_gantt_chart(vessels, chart_path, instance_id):
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    for vessel in vessels:
-        bar = ax.barh(
-            y=vessel.point, 
-            width=(vessel.departure_time - vessel.arrival_time) / 60,  # Convert minutes to hours
-            left=vessel.arrival_time / 60,  # Convert minutes to hours
+INSTANCES_FOLDER = 'instances'
+GANTT_FOLDER = 'gantt_charts'
+
+
+class GanttChart:
+    """
+    One figure, cleared and drawn again for each instance, instead of a new figure per chart.
+    """
+    def __init__(self):
+        self.fig = Figure(figsize=(12, 6))
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+
+    def draw(self, vessels, instance_id):
+        ax = self.ax
+        ax.clear()
+        ax.barh(
+            y=[vessel.point for vessel in vessels],
+            width=[(vessel.departure_time - vessel.arrival_time) / 60 for vessel in vessels],  # Convert minutes to hours
+            left=[vessel.arrival_time / 60 for vessel in vessels],  # Convert minutes to hours
             color="skyblue"
         )
-        
-        # Place vessel number inside the bar
-        ax.text(
-            vessel.arrival_time / 60 + (vessel.departure_time - vessel.arrival_time) / 120,  # Centered inside the bar
-            vessel.point, 
-            vessel.id,  # Vessel number
-            va='center', ha='center', fontsize=9, color='black', fontweight='bold'
-        )
 
-    ax.set_xlabel("Time (Hours)")
-    ax.set_ylabel("Points")
-    ax.set_title(f"Vessel Arrival and Departure Schedule by Points (Instance {instance_id})")
-    plt.grid(axis="x", linestyle="--", alpha=0.7)
-    plt.savefig(chart_path)
-    plt.close(fig)
-    
-
-def main():
-    instances_folder = 'instances'
-    gantt_folder = 'gantt_charts'
+        for vessel in vessels:
+            # Place vessel number inside the bar
+            ax.text(
+                vessel.arrival_time / 60 + (vessel.departure_time - vessel.arrival_time) / 120,  # Centered inside the bar
+                vessel.point,
+                vessel.id,  # Vessel number
+                va='center', ha='center', fontsize=9, color='black', fontweight='bold'
+            )
+
+        ax.set_xlabel("Time (Hours)")
+        ax.set_ylabel("Points")
+        ax.set_title(f"Vessel Arrival and Departure Schedule by Points (Instance {instance_id})")
+        ax.grid(axis="x", linestyle="--", alpha=0.7)
+
+
+def plot_gantt_chart(vessels, chart_path, instance_id):
+    chart = GanttChart()
+    chart.draw(vessels, instance_id)
+    chart.fig.savefig(chart_path)
+
+
+def draw_charts(sources, gantt_folder=GANTT_FOLDER):
+    """
+    Saves the charts of some instances with one figure. Returns the chart filename of each instance id.
+    """
+    chart = GanttChart()
+    filenames = {}
+    for source in sources:
+        instance_id, instance = load_instance(source)
+        filenames[instance_id] = f"gantt_{instance_id}.png"
+        chart.draw(instance.vessels, instance_id)
+        chart.fig.savefig(os.path.join(gantt_folder, filenames[instance_id]))
+    return filenames
+
+
+def write_pdf(sources, path):
+    """
+    Saves the charts of some instances as the pages of one PDF.
+    """
+    chart = GanttChart()
+    with PdfPages(path) as pdf:
+        for source in sources:
+            instance_id, instance = load_instance(source)
+            chart.draw(instance.vessels, instance_id)
+            pdf.savefig(chart.fig)
+
+
+def main(instance_ids=None, workers=1, pdf_path=None, force=False, chunk_size=50):
+    instances_folder = INSTANCES_FOLDER
+    gantt_folder = GANTT_FOLDER
     os.makedirs(gantt_folder, exist_ok=True)
-    
-    for filename in sorted(os.listdir(instances_folder)):
-        if filename.endswith('.json'):
-            instance_path = os.path.join(instances_folder, filename)
-            instance = ProblemInstance.from_json(json.load(open(instance_path)))
-            instance_id = filename.split('_')[-1].replace('.json', '')
-    
-            print(f"Generating Gantt chart for {filename}")
-            chart_filename = f"gantt_{instance_id}.png"
-            chart_path = os.path.join(gantt_folder, chart_filename)
-            plot_gantt_chart(instance.vessels, chart_path,  instance_id)
+
+    # the charts to draw: the selected instances, except the ones whose chart was drawn from the same file and code.
+    # The JSON files are used when there are any, even if the bank is up to date, so that adding some or rebuilding
+    # the bank doesn't change the key of the others; only the instances to draw are loaded
+    version = code_version(['draw_instances.py'])
+    manifest = Manifest(gantt_folder)
+    json_sources = [os.path.join(instances_folder, f) for f in json_files(instances_folder)] if os.path.isdir(instances_folder) else []
+    sources = []
+    keys = {}
+    for source in json_sources or instance_sources(instances_folder):
+        instance_id = source_id(source)
+        if instance_ids is not None and int(instance_id) not in instance_ids:
+            continue
+        keys[instance_id] = hashlib.sha256((source_digest(source) + version).encode()).hexdigest()
+        if pdf_path or force or not manifest.is_done(instance_id, keys[instance_id]):
+            sources.append(source)
+
+    if pdf_path:
+        print(f"Generating {len(sources)} Gantt charts in {pdf_path}")
+        write_pdf(sources, pdf_path)
+        return
+
+    print(f"Generating {len(sources)} Gantt charts, {len(keys) - len(sources)} are up to date")
+    chunks = [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+    def finished(chunk, filenames):
+        # saved once per chunk
+        for instance_id, filename in filenames.items():
+            manifest.add(instance_id, keys[instance_id], [filename])
+        manifest.save()
+        print(f"Generated Gantt charts up to {source_name(chunk[-1])}")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk, filenames in zip(chunks, executor.map(draw_charts, chunks, [gantt_folder] * len(chunks))):
+                finished(chunk, filenames)
+    else:
+        for chunk in chunks:
+            finished(chunk, draw_charts(chunk, gantt_folder))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ids', type=int, nargs='+', default=None, help="instance ids to draw (default: all)")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes drawing charts in parallel")
+    parser.add_argument('--pdf', default=None, help="draw the charts as the pages of this PDF instead of PNG files")
+    parser.add_argument('--force', action='store_true', help="draw every chart again, even the up to date ones")
+    args = parser.parse_args()
+    main(instance_ids=set(args.ids) if args.ids else None, workers=args.workers, pdf_path=args.pdf, force=args.force)
@@ -1,142 +1,279 @@
-import pickle
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib import rcParams
 import matplotlib.patches as patches
-from matplotlib.animation import FuncAnimation
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import numpy as np
+import subprocess
+import argparse
+import io
 import os
 
+from trajectory import load_solution
 
-from port_state import *
-
-def draw_state(ax, data):
-    ax.clear()
-    max_distance_km = 25
-    point_spacing_km = 0.37  # 370 meters
-    barge_count = len(data['barges'])
-    barge_ys = list(reversed([i * 0.6 for i in range(barge_count)]))  # increased spacing
-
-    # Draw 370m markers
-    for x in range(0, int(max_distance_km / point_spacing_km) + 1):
-        ax.axvline(x * point_spacing_km, color='lightgray', linestyle='--', linewidth=0.5)
-
-    # Tide speed indicator (with arrow)
-    tide = data['tide_speed']
-    tide_color = 'blue' if tide > 0 else 'red' if tide < 0 else 'gray'
-    tide_arrow_dx = 0.5 if tide > 0 else -0.5 if tide < 0 else 0
-    ax.arrow(max_distance_km / 2, barge_ys[0] + 1.8, tide_arrow_dx, 0, head_width=0.15, head_length=0.2, fc=tide_color, ec=tide_color)
-    ax.text(max_distance_km / 2, barge_ys[0] + 2.1, f"Tide: {tide:+.2f} kn", color=tide_color, fontsize=12, fontweight='bold', ha='center')
-
-    # Plot vessels
-    vessel_y = barge_ys[0] + 0.9
-    for i, vessel in enumerate(data['vessels']):
-        if vessel['arrival_time'] > data['time'] or vessel['departure_time'] <= data['time']:
-            continue
-        x = vessel['position'] / 1000
-        ax.plot(x, vessel_y, marker='s', markersize=14, color='black')
-        ax.text(x, vessel_y-0.05, vessel['id'], ha='center', fontsize=9, color='white', fontweight='bold')
-
-        total = vessel['fuel_demand']
-        remaining = vessel['current_fuel_demand']
-        demand_ratio = remaining / total if total > 0 else 0
-        ax.add_patch(patches.Rectangle((x - 0.25, vessel_y - 0.25), 0.5, 0.05, color='lightgray'))
-        ax.add_patch(patches.Rectangle((x - 0.25, vessel_y - 0.25), 0.5 * demand_ratio, 0.05, color='teal'))
-        
-        # Clock showing minutes until departure
-        total_time = vessel['departure_time'] - vessel['arrival_time']
-        time_left = vessel['departure_time'] - data['time']
-        if total_time > 0:
-            ratio = max(0, min(1, time_left / total_time))
-            clock_radius = 0.12
-            # Background circle
-            ax.add_patch(patches.Circle((x, vessel_y + 0.3), clock_radius, color='lightgray'))
-            # Wedge for remaining time
-            angle = 360 * ratio
-            face_color = 'lime' if time_left > 120 else 'orange'
-            ax.add_patch(patches.Wedge((x, vessel_y + 0.3), clock_radius, 90, 90 - angle, facecolor=face_color))
-            ax.text(x, vessel_y + 0.26, f"{time_left/60:.0f}h", ha='center', color="black", fontsize=7)
-
-    # Plot barges
-    action_colors = {
-        'GO': 'orange',
-        'SETUP_INIT': 'green',
-        'SETUP_END': 'red',
-        'REFUEL': 'blue',
-        'FUEL': 'purple',
-        'IDLE': 'gray'
-    }
-
-    for i, barge in enumerate(data['barges']):
-        x = barge['location'] / 1000
-        y = barge_ys[i]
-
-        capacity = barge['fuel_capacity']
-        fuel_ratio = barge['current_fuel'] / capacity if capacity > 0 else 0
-        action = barge['action_queue'][0].split(':')[0] if barge['action_queue'] else 'IDLE'
-        color = action_colors.get(action.upper(), 'gray')
-
-        # Draw barge marker with full opacity color by action
-        ax.plot(x, y, marker='o', markersize=10, color=color)
-
-        # Show barge ID
-        ax.text(x, y + 0.25, f"B{barge['id']}", ha='center', fontsize=9, fontweight='bold')
-
-        # Show current action
-        ax.text(x, y - 0.35, action, ha='center', fontsize=8)
-
-        # Fuel bar
-        ax.add_patch(patches.Rectangle((x - 0.25, y+0.15), 0.5, 0.05, color='lightgray'))
-        ax.add_patch(patches.Rectangle((x - 0.25, y+0.15), 0.5 * fuel_ratio, 0.05, color=color))
-
-        # Speed
-        speed = barge['speed']
-        ax.text(x + 0.5, y-0.1, f"{speed:.1f} kn", fontsize=7, ha='center', color='black')
-        
-        # Connection visualization
-        if barge.get('current_vessel_id') is not None:
-            vessel = next((v for v in data['vessels'] if v['id'] == barge['current_vessel_id']), None)
-            if vessel:
-                vessel_x = vessel['position'] / 1000
-                vessel_y = barge_ys[0] + 0.9
-                progress = 0
-                if action == 'SETUP_INIT':
-                    progress = min(1.0, (barge.get('setup_init_progress') or 0) / 60)
-                elif action == 'SETUP_END':
-                    progress = min(1.0, (barge.get('setup_end_progress') or 0) / 60)
+MAX_DISTANCE_KM = 25
+POINT_SPACING_KM = 0.37  # 370 meters
+NUM_POINTS = 68
+
+ACTION_COLORS = {
+    'GO': 'orange',
+    'SETUP_INIT': 'green',
+    'SETUP_END': 'red',
+    'REFUEL': 'blue',
+    'FUEL': 'purple',
+    'IDLE': 'gray'
+}
+
+
+class Renderer:
+    """
+    Draws the states of one solution. The background (gridlines, axes and docking point labels) is drawn once, and
+    each frame only updates the artists of the tide, vessels and barges in place, and blits them over the background.
+    """
+    def __init__(self, trajectory, figsize=(16, 6), dpi=100):
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        ax = self.ax = self.fig.add_subplot()
+        barge_count = len(trajectory.barge_id)
+        self.barge_ys = list(reversed([i * 0.6 for i in range(barge_count)]))  # increased spacing
+        self.vessel_y = self.barge_ys[0] + 0.9
+
+        # Draw 370m markers
+        for x in range(0, int(MAX_DISTANCE_KM / POINT_SPACING_KM) + 1):
+            ax.axvline(x * POINT_SPACING_KM, color='lightgray', linestyle='--', linewidth=0.5)
+        ax.set_xlim(-1, MAX_DISTANCE_KM)
+        ax.set_ylim(-1, self.barge_ys[0] + 2.5)
+        ax.set_xlabel("Distance from Origin (km)")
+        ax.set_yticks([])
+        # Add secondary x-axis at the top for docking point labels
+        secax = ax.secondary_xaxis('top')
+        secax.set_xticks([i * POINT_SPACING_KM for i in range(NUM_POINTS)])
+        secax.set_xticklabels([f"D{i}" if i > 0 else "Origin" for i in range(NUM_POINTS)], rotation=45, fontsize=8)
+        secax.set_xlabel("Docking Point Index")
+
+        # Tide speed indicator (with arrow)
+        self.tide_arrow = ax.arrow(MAX_DISTANCE_KM / 2, self.barge_ys[0] + 1.8, 0, 0, head_width=0.15, head_length=0.2)
+        self.tide_text = ax.text(MAX_DISTANCE_KM / 2, self.barge_ys[0] + 2.1, "", fontsize=12, fontweight='bold', ha='center')
+
+        # one set of artists per vessel and per barge, hidden or moved as needed
+        self.vessels = []
+        for vessel_id in trajectory.vessel_id:
+            self.vessels.append({
+                'marker': ax.plot([], [], marker='s', markersize=14, color='black')[0],
+                'id': ax.text(0, 0, int(vessel_id), ha='center', fontsize=9, color='white', fontweight='bold'),
+                'demand_background': ax.add_patch(patches.Rectangle((0, 0), 0.5, 0.05, color='lightgray')),
+                'demand': ax.add_patch(patches.Rectangle((0, 0), 0.5, 0.05, color='teal')),
+                # Clock showing minutes until departure
+                'clock_background': ax.add_patch(patches.Circle((0, 0), 0.12, color='lightgray')),
+                'clock': ax.add_patch(patches.Wedge((0, 0), 0.12, 90, 90)),
+                'clock_text': ax.text(0, 0, "", ha='center', color="black", fontsize=7),
+            })
+        self.barges = []
+        for barge_id in trajectory.barge_id:
+            self.barges.append({
+                'marker': ax.plot([], [], marker='o', markersize=10)[0],
+                'id': ax.text(0, 0, f"B{barge_id}", ha='center', fontsize=9, fontweight='bold'),
+                'action': ax.text(0, 0, "", ha='center', fontsize=8),
+                'fuel_background': ax.add_patch(patches.Rectangle((0, 0), 0.5, 0.05, color='lightgray')),
+                'fuel': ax.add_patch(patches.Rectangle((0, 0), 0.5, 0.05)),
+                'speed': ax.text(0, 0, "", fontsize=7, ha='center', color='black'),
+                'connection': ax.plot([], [], linestyle='-', linewidth=2)[0],
+            })
+        ax.set_title("Port State at Minute 0", fontsize=14)
+
+        # drawn in the order Axes.draw would draw them
+        self.artists = [self.tide_arrow, self.tide_text, ax.title]
+        for group in self.vessels + self.barges:
+            self.artists.extend(group.values())
+        self.artists.sort(key=lambda artist: artist.get_zorder())
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.fig.tight_layout()
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def update(self, data):
+        """
+        Updates the artists to a state in the format of PortState.to_dict.
+        """
+        tide = data['tide_speed']
+        tide_color = 'blue' if tide > 0 else 'red' if tide < 0 else 'gray'
+        self.tide_arrow.set_data(dx=0.5 if tide > 0 else -0.5 if tide < 0 else 0)
+        self.tide_arrow.set_color(tide_color)
+        self.tide_text.set_text(f"Tide: {tide:+.2f} kn")
+        self.tide_text.set_color(tide_color)
+
+        vessel_y = self.vessel_y
+        vessel_positions = {vessel['id']: vessel['position'] / 1000 for vessel in data['vessels']}
+        for artists, vessel in zip(self.vessels, data['vessels']):
+            visible = vessel['arrival_time'] <= data['time'] < vessel['departure_time']
+            total_time = vessel['departure_time'] - vessel['arrival_time']
+            for name, artist in artists.items():
+                artist.set_visible(visible and (total_time > 0 or not name.startswith('clock')))
+            if not visible:
+                continue
+            x = vessel_positions[vessel['id']]
+            artists['marker'].set_data([x], [vessel_y])
+            artists['id'].set_position((x, vessel_y - 0.05))
+
+            total = vessel['fuel_demand']
+            remaining = vessel['current_fuel_demand']
+            demand_ratio = remaining / total if total > 0 else 0
+            artists['demand_background'].set_xy((x - 0.25, vessel_y - 0.25))
+            artists['demand'].set_xy((x - 0.25, vessel_y - 0.25))
+            artists['demand'].set_width(0.5 * demand_ratio)
+
+            if total_time > 0:
+                time_left = vessel['departure_time'] - data['time']
+                ratio = max(0, min(1, time_left / total_time))
+                artists['clock_background'].set_center((x, vessel_y + 0.3))
+                # Wedge for remaining time
+                artists['clock'].set_center((x, vessel_y + 0.3))
+                artists['clock'].set_theta2(90 - 360 * ratio)
+                artists['clock'].set_facecolor('lime' if time_left > 120 else 'orange')
+                artists['clock_text'].set_position((x, vessel_y + 0.26))
+                artists['clock_text'].set_text(f"{time_left/60:.0f}h")
+
+        for artists, barge, y in zip(self.barges, data['barges'], self.barge_ys):
+            x = barge['location'] / 1000
+            capacity = barge['fuel_capacity']
+            fuel_ratio = barge['current_fuel'] / capacity if capacity > 0 else 0
+            action = barge['action_queue'][0].split(':')[0] if barge['action_queue'] else 'IDLE'
+            color = ACTION_COLORS.get(action.upper(), 'gray')
+
+            artists['marker'].set_data([x], [y])
+            artists['marker'].set_color(color)
+            artists['id'].set_position((x, y + 0.25))
+            artists['action'].set_position((x, y - 0.35))
+            artists['action'].set_text(action)
+            artists['fuel_background'].set_xy((x - 0.25, y + 0.15))
+            artists['fuel'].set_xy((x - 0.25, y + 0.15))
+            artists['fuel'].set_width(0.5 * fuel_ratio)
+            artists['fuel'].set_color(color)
+            artists['speed'].set_position((x + 0.5, y - 0.1))
+            artists['speed'].set_text(f"{barge['speed']:.1f} kn")
+
+            # Connection visualization
+            connection = artists['connection']
+            connection.set_visible(False)
+            vessel_x = vessel_positions.get(barge.get('current_vessel_id'))
+            if vessel_x is not None:
+                connection.set_color(color)
                 if action in ['SETUP_INIT', 'SETUP_END']:
-                    ax.plot([x, vessel_x], [y, y + (vessel_y-y)*progress], color=color, linestyle='-', linewidth=2)
+                    progress = barge.get('setup_init_progress' if action == 'SETUP_INIT' else 'setup_end_progress') or 0
+                    connection.set_data([x, vessel_x], [y, y + (vessel_y - y) * min(1.0, progress / 60)])
+                    connection.set_visible(True)
                 elif action == 'FUEL':
-                    ax.plot([x, vessel_x], [y, vessel_y], color=color, linestyle='-', linewidth=2)
-
-    ax.set_xlim(-1, max_distance_km)
-    ax.set_ylim(-1, barge_ys[0] + 2.5)
-    ax.set_xlabel("Distance from Origin (km)")
-    ax.set_yticks([])
-    # Add secondary x-axis at the top for docking point labels
-    secax = ax.secondary_xaxis('top')
-    num_points = 68
-    tick_positions = [i * point_spacing_km for i in range(num_points)]
-    tick_labels = [f"D{i}" if i > 0 else "Origin" for i in range(num_points)]
-    secax.set_xticks(tick_positions)
-    secax.set_xticklabels(tick_labels, rotation=45, fontsize=8)
-    secax.set_xlabel("Docking Point Index")
-
-    ax.set_title(f"Port State at Minute {data['time']}", fontsize=14)
-    plt.tight_layout()
-
-
-def main(solution_id = 0):
+                    connection.set_data([x, vessel_x], [y, vessel_y])
+                    connection.set_visible(True)
+
+        self.ax.title.set_text(f"Port State at Minute {data['time']}")
+
+    def render(self, data):
+        """
+        Returns the image of a state, as an RGBA array (a view of the canvas, overwritten by the next frame).
+        """
+        self.update(data)
+        self.canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+def select_frames(trajectory, start=None, end=None, every=1):
+    """
+    Returns the rows of a trajectory with a time from `start` to `end` (inclusive), keeping one in `every`.
+    """
+    times = np.asarray(trajectory.time)
+    selected = np.ones(len(times), dtype=bool)
+    if start is not None:
+        selected &= times >= start
+    if end is not None:
+        selected &= times <= end
+    return np.flatnonzero(selected)[::every].tolist()
+
+
+def render_frames(solution_file, frames, quantize=False):
+    """
+    Renders some rows of a solution, as PNG files in memory, so process pools send back little data. With `quantize`,
+    the images are reduced to 256 colors for a GIF, which is the slowest part of writing one, so it's done here.
+    """
+    trajectory = load_solution(solution_file)
+    renderer = Renderer(trajectory)
+    images = []
+    for frame in frames:
+        image = Image.fromarray(renderer.render(trajectory.state(frame))).convert('RGB')
+        if quantize:
+            image = image.quantize(method=Image.Quantize.FASTOCTREE)
+        png = io.BytesIO()
+        image.save(png, format='png', compress_level=1)
+        images.append(png.getvalue())
+    return images
+
+
+def render_chunks(solution_file, frames, workers=1, quantize=False, chunk_size=50):
+    """
+    Yields the PNG images of the frames in order, rendered in chunks by `workers` processes.
+    """
+    chunks = [frames[i:i + chunk_size] for i in range(0, len(frames), chunk_size)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for images in executor.map(render_frames, [solution_file] * len(chunks), chunks, [quantize] * len(chunks)):
+                yield from images
+    else:
+        for chunk in chunks:
+            yield from render_frames(solution_file, chunk, quantize)
+
+
+def write_gif(path, images, fps):
+    frames = [Image.open(io.BytesIO(image)) for image in images]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=1000 / fps, loop=0)
+
+
+def write_mp4(path, images, fps):
+    # frames are piped to ffmpeg as they are rendered, so they are never all in memory
+    ffmpeg = None
+    for image in images:
+        frame = np.asarray(Image.open(io.BytesIO(image)).convert('RGB'))
+        if ffmpeg is None:
+            height, width = frame.shape[:2]
+            ffmpeg = subprocess.Popen([rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+                                       '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-r', str(fps), '-i', '-',
+                                       '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', path],
+                                      stdin=subprocess.PIPE)
+        ffmpeg.stdin.write(frame.tobytes())
+    if ffmpeg is not None:
+        ffmpeg.stdin.close()
+        if ffmpeg.wait():
+            raise RuntimeError(f"ffmpeg failed to write {path}")
+
+
+def main(solution_id = 0, start=None, end=None, every=1, workers=1, video_format='gif', fps=5):
     os.makedirs("animations", exist_ok=True)
-    solution_file = f'solutions_greedy/solution_{solution_id:04d}.pickle'
-    animation_file = f'animations/animation_{solution_id:04d}.gif'
-    states = pickle.load(open(solution_file, 'rb'))
-    def update(frame):
-        print("%.2f" % (100*frame/len(states)), '%')
-        draw_state(ax, states[frame])
-    
-    fig, ax = plt.subplots(figsize=(16, 6))
-    anim = FuncAnimation(fig, update, frames=len(states), interval=200)  # interval in ms
+    solution_file = f'solutions_greedy/solution_{solution_id:04d}.npz'
+    if not os.path.exists(solution_file):
+        solution_file = f'solutions_greedy/solution_{solution_id:04d}.pickle'
+    animation_file = f'animations/animation_{solution_id:04d}.{video_format}'
+    frames = select_frames(load_solution(solution_file), start, end, every)
+    images = render_chunks(solution_file, frames, workers, quantize=video_format == 'gif')
     # fps = frames per second = simulation minutes per real second - in this example, 1sec=5min
-    anim.save(animation_file, fps=5) # saving the gif animation representing the json file
+    if video_format == 'mp4':
+        write_mp4(animation_file, images, fps)
+    else:
+        write_gif(animation_file, images, fps)
+    print(f"Saved {animation_file} ({len(frames)} frames)")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ids', type=int, nargs='*', default=[0], help="ids of the greedy solutions to animate")
+    parser.add_argument('--start', type=int, default=None, help="first minute of the animation")
+    parser.add_argument('--end', type=int, default=None, help="last minute of the animation")
+    parser.add_argument('--every', type=int, default=1, help="draw one saved state in this many")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes rendering frames in parallel")
+    parser.add_argument('--format', choices=['gif', 'mp4'], default='gif', help="mp4 needs ffmpeg")
+    parser.add_argument('--fps', type=int, default=5)
+    args = parser.parse_args()
+    for solution_id in args.ids:
+        main(solution_id, args.start, args.end, args.every, args.workers, args.format, args.fps)
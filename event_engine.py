@@ -0,0 +1,72 @@
+from port_state import ProblemInstance, PortState
+
+# The event-driven engine reproduces the minute-stepped `algorithm.solve` exactly (tolerance 0): barges are advanced
+# with the same PortState.advance_barge arithmetic, only the minutes where nothing can be decided are not visited.
+
+
+class EventDrivenSimulation:
+    """
+    Simulates an instance by jumping between the times where something happens, instead of ticking every minute.
+
+    New assignments can only become possible when a vessel arrives or when a barge empties its action queue (which
+    also releases its vessel or the ORIGIN), so those are the only times where the algorithm is asked to choose.
+    Vessel departures are also visited, so the recorded states show them leaving.
+    """
+    def __init__(self, problem_instance: ProblemInstance, port_state: PortState = None):
+        # the simulation can also continue from a given state, which is then advanced in place
+        self.port_state = port_state or PortState(problem_instance)
+        self.max_time = max(v.departure_time for v in problem_instance.vessels)
+        self.vessel_events = sorted({t for v in problem_instance.vessels for t in (v.arrival_time, v.departure_time)})
+        # barge id -> time when its action queue becomes empty
+        self.free_times = {b.barge.id: self.predict_free_time(b.barge.id) for b in self.port_state.barge_states if b.action_queue}
+
+    def next_event_time(self):
+        now = self.port_state.time
+        next_time = self.max_time if now < self.max_time else self.max_time + 1
+        for t in self.vessel_events:
+            if t > now:
+                next_time = min(next_time, t)
+                break
+        for t in self.free_times.values():
+            if t > now:
+                next_time = min(next_time, t)
+        return next_time
+
+    def advance_to(self, time):
+        """
+        Moves every busy barge, and the clock, to the given time.
+        """
+        for barge_state in self.port_state.barge_states:
+            if barge_state.action_queue:
+                self.port_state.advance_barge_until(barge_state, self.port_state.time, time)
+        self.port_state.time = time
+
+    def predict_free_time(self, barge_id):
+        # barges don't depend on each other while busy, so a throwaway copy tells when this one will be free again
+        probe = self.port_state.clone()
+        barge_state = probe.get_barge_state(barge_id)
+        return probe.advance_barge_until(barge_state, probe.time, self.max_time + 1)
+
+    def decide(self, algorithm):
+        nearest = getattr(algorithm, 'nearest', None) # as in solve
+        assignments = self.port_state.get_possible_assignments(nearest)
+        while assignments:
+            assignment_choice = algorithm.choose(assignments, self.port_state)
+            self.port_state.apply_assignment(assignment_choice[0], assignment_choice[1])
+            self.free_times[assignment_choice[0]] = self.predict_free_time(assignment_choice[0])
+            assignments = self.port_state.get_possible_assignments(nearest)
+
+    def run(self, algorithm):
+        """
+        Returns the states at every visited time, recorded (like `solve`) before the decisions of that minute.
+        """
+        states = []
+        while self.port_state.time <= self.max_time:
+            states.append(self.port_state.to_dict())
+            self.decide(algorithm)
+            self.advance_to(self.next_event_time())
+        return states
+
+
+def solve_event_driven(algorithm, instance):
+    return EventDrivenSimulation(instance).run(algorithm)
@@ -1,16 +1,41 @@
 from problem_instance import ProblemInstance
+from instance_bank import InstanceBank
+import numpy as np
 import random
 import os
+import argparse
 
-def main():
-    instances_folder = 'instances'
+# Benchmark tiers for ProblemInstance.generate_scaled ('default' is the size of the original instances)
+TIERS = {
+    'small': dict(num_vessels=10, horizon=24*60, num_points=67, num_barges=3),
+    'default': dict(num_vessels=30, horizon=24*60, num_points=67, num_barges=7),
+    'large': dict(num_vessels=300, horizon=3*24*60, num_points=200, num_barges=20),
+    'huge': dict(num_vessels=3000, horizon=7*24*60, num_points=1000, num_barges=100),
+}
+
+def main(tier=None, count=1000):
+    if tier is None:
+        instances_folder = 'instances'
+    else:
+        instances_folder = f'instances_{tier}'
     os.makedirs(instances_folder, exist_ok=True)  # Ensure the output folder exists
     
-    for i in range(1000):
-        random.seed(i) 
-        problem = ProblemInstance.generate()
-        with open("instances/instance_%04d.json" % i, 'w') as file:
+    instances = []
+    for i in range(count):
+        if tier is None:
+            random.seed(i) 
+            problem = ProblemInstance.generate()
+        else:
+            problem = ProblemInstance.generate_scaled(np.random.default_rng(i), **TIERS[tier])
+        with open(os.path.join(instances_folder, "instance_%04d.json" % i), 'w') as file:
             file.write(problem.to_json())
+        instances.append(problem)
+    # the same instances in one file, which is what the other scripts read when it exists
+    InstanceBank.from_instances(instances).save(instances_folder + '.npz')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tier', choices=list(TIERS), default=None, help="benchmark tier (default: the original instances)")
+    parser.add_argument('--count', type=int, default=1000, help="number of instances")
+    args = parser.parse_args()
+    main(tier=args.tier, count=args.count)
@@ -0,0 +1,186 @@
+from problem_instance import ProblemInstance
+from column_table import ColumnTable
+import numpy as np
+import argparse
+import hashlib
+import json
+import os
+
+INSTANCES_FOLDER = 'instances'
+INSTANCE_BANK = INSTANCES_FOLDER + '.npz' # the bank of a folder is next to it, with the same name
+
+
+class InstanceBank(ColumnTable):
+    """
+    Many instances in one .npz file: the vessels of every instance in one flat table, and the barges in another,
+    with the rows of instance i going from offsets[i] to offsets[i + 1]. Like a Trajectory, it is memory-mapped,
+    so `ProblemInstance.from_bank(bank, i)` only reads the rows of instance i.
+    """
+    LENGTH_COLUMN = 'instance_id'
+
+    def index_of(self, instance_id):
+        """
+        Returns the row of an instance id (the number of its instance_XXXX.json file).
+        """
+        return int(np.flatnonzero(self.instance_id == instance_id)[0])
+
+    @staticmethod
+    def from_instances(instances, instance_ids=None):
+        if instance_ids is None:
+            instance_ids = range(len(instances))
+        vessels = [v for i in instances for v in i.vessels]
+        barges = [b for i in instances for b in i.barges]
+        # the parameters that may be given as ints or floats keep NumPy's inferred dtype, so exporting them gives back the same JSON
+        return InstanceBank({
+            'instance_id': np.array(list(instance_ids), dtype=np.int64),
+            'vessel_offsets': np.cumsum([0] + [len(i.vessels) for i in instances], dtype=np.int64),
+            'barge_offsets': np.cumsum([0] + [len(i.barges) for i in instances], dtype=np.int64),
+            'tide_amplitude': np.array([i.tide_amplitude for i in instances]),
+            'tide_period': np.array([i.tide_period for i in instances], dtype=np.int64),
+            'fuel_flow_rate_per_minute': np.array([i.fuel_flow_rate_per_minute for i in instances]),
+            'origin_setup_time': np.array([i.origin_setup_time for i in instances], dtype=np.int64),
+            'vessel_setup_time': np.array([i.vessel_setup_time for i in instances], dtype=np.int64),
+            'vessel_id': np.array([v.id for v in vessels], dtype=np.int64),
+            'arrival_time': np.array([v.arrival_time for v in vessels], dtype=np.int64),
+            'departure_time': np.array([v.departure_time for v in vessels], dtype=np.int64),
+            'fuel_demand': np.array([v.fuel_demand for v in vessels]),
+            'point': np.array([v.point for v in vessels], dtype=np.int64),
+            'barge_id': np.array([b.id for b in barges], dtype=np.int64),
+            'fuel_capacity': np.array([b.fuel_capacity for b in barges]),
+            'base_move_speed_knots': np.array([b.base_move_speed_knots for b in barges]),
+            'move_speed_per_ton': np.array([b.move_speed_per_ton for b in barges]),
+        })
+
+    @staticmethod
+    def from_folder(folder):
+        """
+        Imports every instance_XXXX.json file of a folder.
+        """
+        filenames = json_files(folder)
+        instances = []
+        for filename in filenames:
+            with open(os.path.join(folder, filename)) as file:
+                instances.append(ProblemInstance.from_json(json.load(file)))
+        return InstanceBank.from_instances(instances, [int(f.split('_')[-1].split('.')[0]) for f in filenames])
+
+    def to_folder(self, folder):
+        """
+        Exports every instance as an instance_XXXX.json file.
+        """
+        os.makedirs(folder, exist_ok=True)
+        for i in range(len(self)):
+            with open(os.path.join(folder, "instance_%04d.json" % self.instance_id[i]), 'w') as file:
+                file.write(ProblemInstance.from_bank(self, i).to_json())
+
+
+_open_banks = {}
+
+def open_bank(path):
+    """
+    Returns the memory-mapped InstanceBank of a file, opened once per process (and again if the file changes).
+    """
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    if key not in _open_banks:
+        _open_banks[key] = InstanceBank.load(path)
+    return _open_banks[key]
+
+
+def json_files(folder):
+    return sorted(filename for filename in os.listdir(folder) if filename.endswith('.json'))
+
+
+def bank_is_current(folder=INSTANCES_FOLDER):
+    """
+    Whether the bank of a folder holds its instances: it has the ids of its JSON files and none of them is newer.
+    Without the folder, the bank is all there is.
+    """
+    bank_path = folder.rstrip('/') + '.npz'
+    if not os.path.exists(bank_path):
+        return False
+    if not os.path.isdir(folder):
+        return True
+    filenames = json_files(folder)
+    bank_time = os.path.getmtime(bank_path)
+    if any(os.path.getmtime(os.path.join(folder, filename)) > bank_time for filename in filenames):
+        return False
+    return sorted(source_id(filename) for filename in filenames) == sorted("%04d" % i for i in open_bank(bank_path).instance_id)
+
+
+def instance_sources(folder=INSTANCES_FOLDER):
+    """
+    Returns a source for every instance of a folder: (bank path, row) if its bank is up to date, otherwise the path
+    of its JSON file.
+    """
+    bank_path = folder.rstrip('/') + '.npz'
+    if bank_is_current(folder):
+        return [(bank_path, i) for i in range(len(open_bank(bank_path)))]
+    if os.path.exists(bank_path):
+        print(f"Warning: {bank_path} doesn't match the JSON files of {folder}, which are used instead (python instance_bank.py rebuilds it)")
+    return [os.path.join(folder, filename) for filename in json_files(folder)]
+
+
+def source_id(source):
+    """
+    Returns the instance id of a source of `instance_sources`, the XXXX of instance_XXXX.json, without loading it.
+    """
+    if isinstance(source, tuple):
+        bank_path, i = source
+        return "%04d" % open_bank(bank_path).instance_id[i]
+    return os.path.basename(source).split('_')[-1].split('.')[0]
+
+
+def source_digest(source):
+    """
+    Returns a hash of the content of a source of `instance_sources` without parsing it: the bytes of its JSON file,
+    or its rows of the bank. The two differ for the same instance.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, tuple):
+        bank_path, i = source
+        bank = open_bank(bank_path)
+        vessels = slice(bank.vessel_offsets[i], bank.vessel_offsets[i + 1])
+        barges = slice(bank.barge_offsets[i], bank.barge_offsets[i + 1])
+        for name in ('tide_amplitude', 'tide_period', 'fuel_flow_rate_per_minute', 'origin_setup_time', 'vessel_setup_time'):
+            digest.update(np.ascontiguousarray(bank.columns[name][i:i + 1]).tobytes())
+        for name in ('vessel_id', 'arrival_time', 'departure_time', 'fuel_demand', 'point'):
+            digest.update(np.ascontiguousarray(bank.columns[name][vessels]).tobytes())
+        for name in ('barge_id', 'fuel_capacity', 'base_move_speed_knots', 'move_speed_per_ton'):
+            digest.update(np.ascontiguousarray(bank.columns[name][barges]).tobytes())
+    else:
+        with open(source, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def load_instance(source):
+    """
+    Returns (instance_id, ProblemInstance) for a source of `instance_sources`.
+    """
+    if isinstance(source, tuple):
+        bank_path, i = source
+        return source_id(source), ProblemInstance.from_bank(open_bank(bank_path), i)
+    with open(source) as file:
+        return source_id(source), ProblemInstance.from_json(json.load(file))
+
+
+def source_name(source):
+    if isinstance(source, tuple):
+        return f"{os.path.basename(source[0])}[{source[1]}]"
+    return os.path.basename(source)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', action='store_true', help="write the JSON files of the bank, instead of building the bank from them")
+    parser.add_argument('--folder', default=INSTANCES_FOLDER)
+    parser.add_argument('--bank', default=INSTANCE_BANK)
+    args = parser.parse_args()
+    if args.export:
+        InstanceBank.load(args.bank).to_folder(args.folder)
+        os.utime(args.bank) # the JSON files are the bank's, so it isn't out of date
+    else:
+        InstanceBank.from_folder(args.folder).save(args.bank)
+
+
+if __name__ == "__main__":
+    main()
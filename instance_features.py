@@ -0,0 +1,126 @@
+from instance_bank import InstanceBank, INSTANCES_FOLDER, bank_is_current, json_files
+from result_cache import code_version
+from column_table import ColumnTable
+import numpy as np
+import hashlib
+import os
+
+# The features of a folder of instances are cached next to it, like its bank
+FEATURES_SUFFIX = '_features.npz'
+
+
+def occupancy_curve(arrival_times, departure_times, instances=None):
+    """
+    Returns the number of vessels present as a step function, from a sweep over the sorted arrivals (+1) and
+    departures (-1): (times, counts), with counts[i] vessels from times[i] until the next time. A vessel is present
+    from its arrival until its departure (excluded). With the instance of each vessel in `instances`, the curves of
+    all the instances are computed at once, and (instances, times, counts) is returned, sorted by instance.
+    """
+    arrival_times = np.asarray(arrival_times, dtype=np.int64)
+    departure_times = np.asarray(departure_times, dtype=np.int64)
+    event_instances = np.zeros(2 * len(arrival_times), dtype=np.int64) if instances is None else np.concatenate([instances, instances])
+    event_times = np.concatenate([arrival_times, departure_times])
+    changes = np.concatenate([np.ones(len(arrival_times), dtype=np.int64), -np.ones(len(departure_times), dtype=np.int64)])
+    order = np.lexsort((event_times, event_instances))
+    event_instances, event_times = event_instances[order], event_times[order]
+    # every vessel that arrives departs, so each instance adds up to 0, and one cumsum gives the counts of all of them
+    counts = np.cumsum(changes[order])
+    # of the events of an instance at the same minute, only the count after the last one holds
+    last = np.ones(len(event_times), dtype=bool)
+    last[:-1] = (event_times[1:] != event_times[:-1]) | (event_instances[1:] != event_instances[:-1])
+    if instances is None:
+        return event_times[last], counts[last]
+    return event_instances[last], event_times[last], counts[last]
+
+
+class FeatureTable(ColumnTable):
+    """
+    The features of many instances, one row per instance: number of vessels, total fuel demand, peak number of
+    vessels present at once and last departure, and the occupancy curve of instance i, the step function
+    (curve_time, curve_count) from curve_offsets[i] to curve_offsets[i + 1].
+    """
+    LENGTH_COLUMN = 'instance_id'
+
+    @staticmethod
+    def from_bank(bank, source_hash=''):
+        """
+        Extracts the features of every instance of an InstanceBank at once, from its vessel table.
+        """
+        num_instances = len(bank)
+        offsets = np.asarray(bank.vessel_offsets)
+        num_vessels = np.diff(offsets)
+        vessel_instances = np.repeat(np.arange(num_instances), num_vessels)
+        curve_instances, curve_time, curve_count = occupancy_curve(bank.arrival_time, bank.departure_time, vessel_instances)
+        peak_vessels = np.zeros(num_instances, dtype=np.int64)
+        np.maximum.at(peak_vessels, curve_instances, curve_count)
+        max_departure = np.zeros(num_instances, dtype=np.int64)
+        np.maximum.at(max_departure, vessel_instances, np.asarray(bank.departure_time))
+        return FeatureTable({
+            'instance_id': np.asarray(bank.instance_id),
+            'num_vessels': num_vessels,
+            'total_fuel_demand': np.bincount(vessel_instances, weights=bank.fuel_demand, minlength=num_instances),
+            'peak_vessels': peak_vessels,
+            'max_departure': max_departure,
+            'curve_offsets': np.searchsorted(curve_instances, np.arange(num_instances + 1)),
+            'curve_time': curve_time,
+            'curve_count': curve_count,
+            'source_hash': np.array(source_hash),
+        })
+
+    def curve(self, i):
+        """
+        Returns the occupancy curve (times, counts) of row i.
+        """
+        start, end = self.curve_offsets[i], self.curve_offsets[i + 1]
+        return self.curve_time[start:end], self.curve_count[start:end]
+
+    def occupancy_moments(self):
+        """
+        Returns the mean and standard deviation over the instances of the number of vessels present at each minute,
+        until the last departure, without building the timeline of each instance.
+        """
+        # the counts and squared counts of all the instances change at the curve times, by the difference with the
+        # previous count of the same instance (0 at the first time of each instance)
+        previous = np.concatenate([[0], self.curve_count[:-1]])
+        previous[self.curve_offsets[:-1][np.diff(self.curve_offsets) > 0]] = 0
+        horizon = int(self.max_departure.max()) + 1 if len(self) else 1
+        sums = np.zeros(horizon + 1)
+        squares = np.zeros(horizon + 1)
+        np.add.at(sums, self.curve_time, self.curve_count - previous)
+        np.add.at(squares, self.curve_time, self.curve_count ** 2 - previous ** 2)
+        mean = np.cumsum(sums)[:horizon] / len(self)
+        variance = np.cumsum(squares)[:horizon] / len(self) - mean ** 2
+        return mean, np.sqrt(np.maximum(variance, 0))
+
+
+def source_hash(folder=INSTANCES_FOLDER):
+    """
+    Returns a hash of the instances of a folder (of its bank if it's up to date, else of its JSON files, read but not
+    parsed) and of this module's code, which changes when either changes.
+    """
+    digest = hashlib.sha256(code_version(['instance_features.py']).encode())
+    bank_path = folder.rstrip('/') + '.npz'
+    paths = [bank_path] if bank_is_current(folder) else [os.path.join(folder, f) for f in json_files(folder)]
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def load_features(folder=INSTANCES_FOLDER):
+    """
+    Returns the FeatureTable of a folder of instances, from its cache, or extracted and cached if the instances
+    (or this code) changed since.
+    """
+    features_path = folder.rstrip('/') + FEATURES_SUFFIX
+    current_hash = source_hash(folder)
+    if os.path.exists(features_path):
+        features = FeatureTable.load(features_path)
+        if str(features.source_hash) == current_hash:
+            return features
+    bank_path = folder.rstrip('/') + '.npz'
+    bank = InstanceBank.load(bank_path) if bank_is_current(folder) else InstanceBank.from_folder(folder)
+    features = FeatureTable.from_bank(bank, current_hash)
+    features.save(features_path)
+    return features
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def linear_sum_assignment(cost):
+    """
+    Returns (rows, cols) of the assignment of rows to columns with the lowest total cost (Hungarian algorithm with
+    potentials, O(n^2 m)). Every row is assigned if there are more columns than rows, and every column otherwise.
+    Same result format as scipy.optimize.linear_sum_assignment, whose costs must also be finite.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 1-based, column 0 is the dummy column the augmenting paths start from
+    u = np.zeros(n + 1) # row potentials
+    v = np.zeros(m + 1) # column potentials
+    match = np.zeros(m + 1, dtype=int) # row assigned to each column, 0 if none
+    way = np.zeros(m + 1, dtype=int) # previous column of each column in the shortest path
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_reduced = np.full(m, np.inf) # per column 1..m
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            free = ~used[1:]
+            reduced = cost[match[j0] - 1] - u[match[j0]] - v[1:]
+            better = free & (reduced < min_reduced)
+            min_reduced[better] = reduced[better]
+            way[1:][better] = j0
+            masked = np.where(free, min_reduced, np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            used_columns = np.flatnonzero(used)
+            u[match[used_columns]] += delta
+            v[used_columns] -= delta
+            min_reduced[free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # flip the matching along the path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(match[1:])
+    rows = match[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
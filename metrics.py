@@ -0,0 +1,151 @@
+import json
+
+# Metric accumulators, updated by `solve` every minute (after that minute's decisions), so the statistics of a
+# solution are known at the end of the simulation without keeping or re-reading its states.
+
+
+class DeliveredFuelCurve:
+    """
+    Fraction of the total demand delivered so far, per minute.
+    """
+    name = "delivered_over_time"
+
+    def __init__(self):
+        self.total_demand = None
+        self.values = []
+
+    def update(self, state):
+        if self.total_demand is None:
+            self.total_demand = sum(v.vessel.fuel_demand for v in state.vessel_states)
+        if self.total_demand == 0:
+            self.values.append(1)
+        else:
+            self.values.append((self.total_demand - sum(v.current_fuel_demand for v in state.vessel_states)) / self.total_demand)
+
+    def summary(self):
+        return self.values
+
+
+class BargeUtilization:
+    """
+    Fraction of the minutes where each barge had something to do.
+    """
+    name = "barge_utilization"
+
+    def __init__(self):
+        self.minutes = 0
+        self.busy = {}
+
+    def update(self, state):
+        self.minutes += 1
+        for b in state.barge_states:
+            self.busy[b.barge.id] = self.busy.get(b.barge.id, 0) + (1 if b.action_queue else 0)
+
+    def summary(self):
+        return {barge_id: busy / self.minutes for barge_id, busy in self.busy.items()}
+
+
+class IdleTime:
+    """
+    Minutes each barge spent without any action.
+    """
+    name = "idle_minutes"
+
+    def __init__(self):
+        self.idle = {}
+
+    def update(self, state):
+        for b in state.barge_states:
+            self.idle[b.barge.id] = self.idle.get(b.barge.id, 0) + (0 if b.action_queue else 1)
+
+    def summary(self):
+        return self.idle
+
+
+class TravelDistance:
+    """
+    Meters travelled by each barge.
+    """
+    name = "travel_distance"
+
+    def __init__(self):
+        self.locations = {}
+        self.distance = {}
+
+    def update(self, state):
+        for b in state.barge_states:
+            self.distance[b.barge.id] = self.distance.get(b.barge.id, 0) + abs(b.location - self.locations.get(b.barge.id, b.location))
+            self.locations[b.barge.id] = b.location
+
+    def summary(self):
+        return self.distance
+
+
+class RefuelCount:
+    """
+    Number of trips of each barge to the ORIGIN.
+    """
+    name = "refuel_count"
+
+    def __init__(self):
+        self.targets = {}
+        self.count = {}
+
+    def update(self, state):
+        for b in state.barge_states:
+            target = b.current_vessel_id
+            if target == 'ORIGIN' and self.targets.get(b.barge.id) != 'ORIGIN':
+                self.count[b.barge.id] = self.count.get(b.barge.id, 0) + 1
+            self.count.setdefault(b.barge.id, 0)
+            self.targets[b.barge.id] = target
+
+    def summary(self):
+        return self.count
+
+
+class UnmetDemand:
+    """
+    Fuel each vessel still needed at the end.
+    """
+    name = "unmet_demand"
+
+    def __init__(self):
+        self.demand = {}
+
+    def update(self, state):
+        for v in state.vessel_states:
+            self.demand[v.vessel.id] = v.current_fuel_demand
+
+    def summary(self):
+        return self.demand
+
+
+class PeakVesselCount:
+    """
+    Largest number of vessels at the port at the same time.
+    """
+    name = "peak_vessel_count"
+
+    def __init__(self):
+        self.peak = 0
+
+    def update(self, state):
+        present = sum(1 for v in state.vessel_states if v.vessel.arrival_time <= state.time < v.vessel.departure_time)
+        self.peak = max(self.peak, present)
+
+    def summary(self):
+        return self.peak
+
+
+def default_metrics():
+    return [DeliveredFuelCurve(), BargeUtilization(), IdleTime(), TravelDistance(), RefuelCount(), UnmetDemand(), PeakVesselCount()]
+
+
+def write_summary(path, metrics):
+    with open(path, 'w') as summary_file:
+        json.dump({metric.name: metric.summary() for metric in metrics}, summary_file)
+
+
+def read_summary(path):
+    with open(path) as summary_file:
+        return json.load(summary_file)
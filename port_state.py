@@ -6,14 +6,46 @@ Created on Thu Apr  3 23:07:25 2025
 """
 
 from problem_instance import *
-import copy
+from typing import NamedTuple
+from collections import deque
+from enum import IntEnum
 import json
+import bisect
+
+class ActionType(IntEnum):
+    GO = 1
+    SETUP_INIT = 2
+    FUEL = 3
+    REFUEL = 4
+    SETUP_END = 5
+
+ORIGIN_ID = -2 # operand of the actions that target the ORIGIN instead of a vessel
+
+class Action(NamedTuple):
+    """
+    An action of a barge's queue: GO (operand = position), SETUP_INIT/FUEL/SETUP_END (operand = vessel id or
+    ORIGIN_ID) or REFUEL (no operand). str() gives the old "GO:1234" form, used by to_dict and the old pickles.
+    """
+    opcode: ActionType
+    operand: int = None
+
+    def __str__(self):
+        if self.operand is None:
+            return self.opcode.name
+        return f"{self.opcode.name}:{'ORIGIN' if self.operand == ORIGIN_ID else self.operand}"
 
 class VesselState:
     def __init__(self, vessel: Vessel):
         self.vessel = vessel
         self.current_fuel_demand = vessel.fuel_demand #To identify the fuel demand of that specific vessel
 
+    def clone(self):
+        # the Vessel itself never changes during a simulation, so it can be shared
+        clone = VesselState.__new__(VesselState)
+        clone.vessel = self.vessel
+        clone.current_fuel_demand = self.current_fuel_demand
+        return clone
+
 class BargeState:
     def __init__(self, barge: Barge):
         self.barge = barge
@@ -22,21 +54,218 @@ class BargeState:
         self.current_vessel_id = None #Initially, the barge isn't connected to any vessel
         self.setup_init_progress = None #Initially, the barge isn't connected to any vessel
         self.setup_end_progress = None #Initially, the barge isn't connected to any vessel
-        self.action_queue = [] #Initially, the barge doesn't have any order to follow
+        self.action_queue = deque() #Initially, the barge doesn't have any order to follow
+
+    def clone(self):
+        # the Barge itself never changes during a simulation, so it can be shared
+        clone = BargeState.__new__(BargeState)
+        clone.barge = self.barge
+        clone.location = self.location
+        clone.current_fuel = self.current_fuel
+        clone.current_vessel_id = self.current_vessel_id
+        clone.setup_init_progress = self.setup_init_progress
+        clone.setup_end_progress = self.setup_end_progress
+        clone.action_queue = deque(self.action_queue)
+        return clone
         
     def get_speed_knots(self, direction, tide_speed):
-        barge_speed_knots = direction * (self.barge.base_move_speed_knots - self.barge.move_speed_per_ton * self.current_fuel)
-        return barge_speed_knots + tide_speed
+        return barge_speed_knots(direction, self.current_fuel, self.barge.base_move_speed_knots, self.barge.move_speed_per_ton, tide_speed)
+
+
+class PositionIndex:
+    """
+    (position, index) pairs sorted by position along the channel, for nearest-neighbour queries in O(log n + k).
+    """
+    def __init__(self, entries=()):
+        self.entries = sorted(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, position, index):
+        bisect.insort(self.entries, (position, index))
+
+    def remove(self, position, index):
+        i = bisect.bisect_left(self.entries, (position, index))
+        if i < len(self.entries) and self.entries[i] == (position, index):
+            self.entries.pop(i)
+
+    def copy(self):
+        copy = PositionIndex.__new__(PositionIndex)
+        copy.entries = list(self.entries)
+        return copy
+
+    def nearest(self, position, k):
+        """
+        Returns the indexes of the k entries closest to `position`, the closest first (on a tie, the lower position).
+        """
+        entries = self.entries
+        right = bisect.bisect_left(entries, (position,)) # first entry at or after the position
+        left = right - 1
+        nearest = []
+        while len(nearest) < k and (left >= 0 or right < len(entries)):
+            if right == len(entries) or (left >= 0 and position - entries[left][0] <= entries[right][0] - position):
+                nearest.append(entries[left][1])
+                left -= 1
+            else:
+                nearest.append(entries[right][1])
+                right += 1
+        return nearest
 
 
 class PortState:
+    profiler = None # a profiling.Profiler, set by solve when profiling
+
     def __init__(self, problem_instance: ProblemInstance):
-        self.time = 0  # Start at time 0
+        self._time = 0  # Start at time 0
+        self.event_count = 0 # assignments and completed actions so far, so observers can tell when something changed
         self.vessel_states = [VesselState(v) for v in problem_instance.vessels]
         self.barge_states = [BargeState(b) for b in problem_instance.barges]
         self.problem_instance = problem_instance
+
+        # id -> position in barge_states / vessel_states. The states are never reordered, so the maps are shared by every clone
+        self.barge_index = {b.barge.id: i for i, b in enumerate(self.barge_states)}
+        self.vessel_index = {v.vessel.id: i for i, v in enumerate(self.vessel_states)}
+
+        # Index of the feasible assignments, kept up to date instead of rescanning every barge and vessel.
+        # The schedules don't change during a simulation, so they are shared by every clone.
+        # a vessel can be served from its arrival until it departs in less than 2*vessel_setup_time
+        self._vessel_cutoffs = [min(v.departure_time, v.departure_time - 2 * problem_instance.vessel_setup_time + 1) for v in problem_instance.vessels]
+        self._arrival_schedule = sorted((v.arrival_time, i) for i, v in enumerate(problem_instance.vessels))
+        self._cutoff_schedule = sorted((t, i) for i, t in enumerate(self._vessel_cutoffs))
+        self._vessel_positions = [v.get_position() for v in problem_instance.vessels]
+        self.reindex()
+
+    def get_barge_state(self, barge_id):
+        return self.barge_states[self.barge_index[barge_id]]
+
+    def get_vessel_state(self, vessel_id):
+        return self.vessel_states[self.vessel_index[vessel_id]]
+
+    @property
+    def time(self):
+        return self._time
+
+    @time.setter
+    def time(self, time):
+        if time < self._time:
+            self._time = time
+            self.reindex()
+        else:
+            self._time = time
+            self._update_vessel_schedule()
+
+    def reindex(self):
+        """
+        Rebuilds the index of feasible assignments from scratch. Only needed after editing barge or vessel states directly.
+        """
+        self.free_barges = [i for i, b in enumerate(self.barge_states) if b.current_vessel_id is None and not b.action_queue] # sorted barge indexes
+        locked_vessel_ids = {b.current_vessel_id for b in self.barge_states}
+        self.origin_locked = 'ORIGIN' in locked_vessel_ids
+        self.waiting_vessels = [i for i, v in enumerate(self.vessel_states) if v.vessel.id not in locked_vessel_ids and self._can_be_served(i)] # sorted vessel indexes
+        # the same vessels, sorted by berth position
+        self.waiting_by_position = PositionIndex((self._vessel_positions[i], i) for i in self.waiting_vessels)
+        self._next_arrival = bisect.bisect_right(self._arrival_schedule, (self._time, len(self.vessel_states)))
+        self._next_cutoff = bisect.bisect_right(self._cutoff_schedule, (self._time, len(self.vessel_states)))
+
+    def _can_be_served(self, vessel_index):
+        vessel_state = self.vessel_states[vessel_index]
+        return vessel_state.current_fuel_demand > 0 and vessel_state.vessel.arrival_time <= self._time < self._vessel_cutoffs[vessel_index]
+
+    def _update_vessel_schedule(self):
+        # vessels that arrived since the last update
+        while self._next_arrival < len(self._arrival_schedule) and self._arrival_schedule[self._next_arrival][0] <= self._time:
+            vessel_index = self._arrival_schedule[self._next_arrival][1]
+            if self._can_be_served(vessel_index):
+                self._add_waiting(vessel_index)
+            self._next_arrival += 1
+        # vessels that can no longer be served in time
+        while self._next_cutoff < len(self._cutoff_schedule) and self._cutoff_schedule[self._next_cutoff][0] <= self._time:
+            vessel_index = self._cutoff_schedule[self._next_cutoff][1]
+            self._remove_waiting(vessel_index)
+            self._next_cutoff += 1
+
+    def _add_waiting(self, vessel_index):
+        bisect.insort(self.waiting_vessels, vessel_index)
+        self.waiting_by_position.add(self._vessel_positions[vessel_index], vessel_index)
+
+    def _remove_waiting(self, vessel_index):
+        position = bisect.bisect_left(self.waiting_vessels, vessel_index)
+        if position < len(self.waiting_vessels) and self.waiting_vessels[position] == vessel_index:
+            self.waiting_vessels.pop(position)
+            self.waiting_by_position.remove(self._vessel_positions[vessel_index], vessel_index)
+
+    def _finish_assignment(self, barge_state):
+        """
+        Releases the barge and its vessel (or the ORIGIN) at the end of SETUP_END.
+        """
+        target = barge_state.current_vessel_id
+        barge_state.current_vessel_id = None
+        if target == 'ORIGIN':
+            self.origin_locked = False
+        elif target is not None:
+            vessel_index = self.vessel_index[target]
+            if self._can_be_served(vessel_index): # it may have been fully supplied
+                self._add_waiting(vessel_index)
+        bisect.insort(self.free_barges, self.barge_index[barge_state.barge.id])
+
+    def clone(self):
+        """
+        Returns an independent copy of the mutable state. The ProblemInstance is shared, as it is never modified.
+        """
+        if self.profiler:
+            self.profiler.count('clones')
+        clone = PortState.__new__(PortState)
+        clone.__dict__.update(self.__dict__)
+        clone.vessel_states = [v.clone() for v in self.vessel_states]
+        clone.barge_states = [b.clone() for b in self.barge_states]
+        clone.free_barges = list(self.free_barges)
+        clone.waiting_vessels = list(self.waiting_vessels)
+        clone.waiting_by_position = self.waiting_by_position.copy()
+        return clone
+
+    def state_key(self):
+        """
+        Returns a hashable key of everything the rest of the simulation depends on: the time, each barge's location,
+        fuel, target, setup progress and queue, and the vessel demands. Different decision orders that lead to the
+        same port state get the same key.
+        """
+        return (
+            self._time,
+            tuple((b.location, b.current_fuel, b.current_vessel_id, b.setup_init_progress, b.setup_end_progress, tuple(b.action_queue))
+                  for b in self.barge_states),
+            tuple(v.current_fuel_demand for v in self.vessel_states),
+        )
+
+    def snapshot(self):
+        """
+        Returns the mutable state as immutable tuples, to go back to it later with `restore`. Lookahead policies fork
+        one scratch state many times this way, without allocating new barge and vessel states for each fork.
+        """
+        return (self.state_key(), self.event_count, self.origin_locked, self._next_arrival, self._next_cutoff,
+                tuple(self.free_barges), tuple(self.waiting_vessels),
+                tuple(self.waiting_by_position.entries))
+
+    def restore(self, snapshot):
+        """
+        Puts this state back as it was at `snapshot` (taken from this state or from one of its clones).
+        """
+        ((self._time, barges, demands), self.event_count, self.origin_locked, self._next_arrival, self._next_cutoff,
+         free_barges, waiting_vessels, waiting_by_position) = snapshot
+        self.free_barges = list(free_barges)
+        self.waiting_vessels = list(waiting_vessels)
+        self.waiting_by_position.entries = list(waiting_by_position)
+        for barge_state, (location, current_fuel, current_vessel_id, setup_init_progress, setup_end_progress, action_queue) in zip(self.barge_states, barges):
+            barge_state.location = location
+            barge_state.current_fuel = current_fuel
+            barge_state.current_vessel_id = current_vessel_id
+            barge_state.setup_init_progress = setup_init_progress
+            barge_state.setup_end_progress = setup_end_progress
+            barge_state.action_queue = deque(action_queue)
+        for vessel_state, demand in zip(self.vessel_states, demands):
+            vessel_state.current_fuel_demand = demand
        
-    def get_possible_assignments(self):
+    def get_possible_assignments(self, nearest=None):
         #if a barge is assigned to a vessel, other barges cannot go to that vessel
         #if a barge is assigned to a vessel, it cannot be assigned to other vessels
         #if a barge is empty, it cannot be assigned to any vessel
@@ -44,40 +273,25 @@ class PortState:
         #if a vessel has a current fuel demand = 0, no barge can be assigned to it
         #return a list of possible assignments in a list of tuples format [(barge_id, vessel_id)]
         #if a barge has less than barge.min_fuel, it needs to go to the origin point [(barge_id, 'ORIGIN')] to completely refill
+        #with `nearest`, a barge is only paired with the `nearest` waiting vessels closest to it
         
+        # the index already holds the free barges and the vessels that can be served, so only candidates are visited
         assignments = []
-        assigned_vessel_ids = set() #set = list without duplicates
-        assigned_barge_ids = set()
-    
-        # Track currently assigned vessels and barges
-        for barge_state in self.barge_states:
-            if barge_state.current_vessel_id is not None:
-                assigned_barge_ids.add(barge_state.barge.id)
-                assigned_vessel_ids.add(barge_state.current_vessel_id)
-    
-        for barge_state in self.barge_states:
-            if barge_state.barge.id in assigned_barge_ids:
-                continue  # Skip already assigned barges
-            if len(barge_state.action_queue) > 0:
-                continue
+        waiting_vessel_ids = [self.vessel_states[i].vessel.id for i in self.waiting_vessels]
+        for barge_index in self.free_barges:
+            barge_state = self.barge_states[barge_index]
             if barge_state.current_fuel < barge_state.barge.min_fuel: #compare against barge-specific threshold
-                if not 'ORIGIN' in assigned_vessel_ids:
+                if not self.origin_locked:
                     assignments.append((barge_state.barge.id, 'ORIGIN'))  #assign to ORIGIN if fuel is too low
                 continue  # skip other assignments if not enough fuel (stay idle at the same place until it is free again)
 
-    
-            for vessel_state in self.vessel_states:
-                vessel = vessel_state.vessel
-                if vessel.id in assigned_vessel_ids:
-                    continue  # Skip already assigned vessels
-                if vessel_state.current_fuel_demand <= 0:
-                    continue  # Vessel doesn't need fuel
-                if not (vessel.arrival_time <= self.time < vessel.departure_time):
-                    continue  # Vessel not at port
-                if vessel.departure_time - self.time < 2 * self.problem_instance.vessel_setup_time:
-                    continue  # Not enough time to serve
-    
-                assignments.append((barge_state.barge.id, vessel.id))
+            if nearest is None:
+                for vessel_id in waiting_vessel_ids:
+                    assignments.append((barge_state.barge.id, vessel_id))
+            else:
+                # in vessel order, as without `nearest`
+                for vessel_index in sorted(self.waiting_by_position.nearest(barge_state.location, nearest)):
+                    assignments.append((barge_state.barge.id, self.vessel_states[vessel_index].vessel.id))
     
         return assignments #it returns the complete list with available assignments in that time
     
@@ -85,109 +299,207 @@ class PortState:
         """
         Applies the assignment of a barge to either a vessel (by vessel_id) or to the ORIGIN for refueling.
         """
-        barge = next((b for b in self.barge_states if b.barge.id == barge_id), None)
-        if barge is None:
+        if barge_id not in self.barge_index:
             print(f"Barge {barge_id} not found.")
             return
+        barge = self.get_barge_state(barge_id)
         if target == 'ORIGIN':
             # Assign the barge to return to origin to refill
+            self.origin_locked = True
             barge.current_vessel_id = target #
-            barge.action_queue.append('GO:0')
-            barge.action_queue.append('SETUP_INIT:ORIGIN')
-            barge.action_queue.append('REFUEL')
-            barge.action_queue.append('SETUP_END:ORIGIN')
+            barge.action_queue.append(Action(ActionType.GO, 0))
+            barge.action_queue.append(Action(ActionType.SETUP_INIT, ORIGIN_ID))
+            barge.action_queue.append(Action(ActionType.REFUEL))
+            barge.action_queue.append(Action(ActionType.SETUP_END, ORIGIN_ID))
+            self._occupy_barge(barge_id)
             
         else:
             # Assign to a vessel
-            vessel = next((v for v in self.vessel_states if v.vessel.id == target), None)
-            if vessel is None:
+            if target not in self.vessel_index:
                 print(f"Vessel {target} not found.")
                 return
+            vessel_index = self.vessel_index[target]
+            self._remove_waiting(vessel_index)
             barge.current_vessel_id = target
-            barge.action_queue.append(f'GO:{vessel.vessel.get_position()}')
-            barge.action_queue.append(f'SETUP_INIT:{target}')
-            barge.action_queue.append(f'FUEL:{target}')
-            barge.action_queue.append(f'SETUP_END:{target}')
+            barge.action_queue.append(Action(ActionType.GO, self._vessel_positions[vessel_index]))
+            barge.action_queue.append(Action(ActionType.SETUP_INIT, target))
+            barge.action_queue.append(Action(ActionType.FUEL, target))
+            barge.action_queue.append(Action(ActionType.SETUP_END, target))
+            self._occupy_barge(barge_id)
+
+    def _complete_action(self, barge_state):
+        if self.profiler:
+            self.profiler.count('completed_' + barge_state.action_queue[0].opcode.name)
+        barge_state.action_queue.popleft()
+        self.event_count += 1
+
+    def _occupy_barge(self, barge_id):
+        self.event_count += 1
+        barge_index = self.barge_index[barge_id]
+        if barge_index in self.free_barges:
+            self.free_barges.remove(barge_index)
 
     def advance_one_minute(self):
+        """
+        Returns a new state one minute ahead, leaving this one untouched.
+        """
+        return self.clone().step()
+
+    def step(self):
+        """
+        Advances this state one minute in place and returns it.
+        """
+        # Handle each barge
+        for barge_state in self.barge_states:
+            if not barge_state.action_queue:
+                continue  # No action to process
+            self.advance_barge(barge_state, self.time)
+
+        # Finally, advance the time
+        self.time += 1
+
+        return self
+
+    def advance_barge(self, barge_state, time):
+        """
+        Performs one minute, starting at the given time, of the first action in the barge's queue.
+        Barges never depend on each other while busy, so each one can be advanced on its own.
+        """
         def advance_setup(progress, setup_time):
             return (progress + 1) if progress is not None else 1, (progress + 1) >= setup_time if progress is not None else False
         def knots_to_m_per_minute(knots):
             return knots * 1852 / 60 # conversion rate
-        new_state = copy.deepcopy(self)
 
-        # Handle each barge
-        for barge_state in new_state.barge_states:
-            if not barge_state.action_queue:
-                continue  # No action to process
-            
-            current_action = barge_state.action_queue[0]
-            tide_speed = self.problem_instance.get_tide_speed_at(self.time)
-            parts = current_action.split(":")
-            action = parts[0]
-
-            if action == "GO":
-                target = int(parts[1])
-                distance_remaining = target - barge_state.location
-                direction = 1 if distance_remaining > 0 else -1
-
-                # Calculate effective speed (knots to m/min)
-                barge_speed_knots = direction * (barge_state.barge.base_move_speed_knots - barge_state.barge.move_speed_per_ton * barge_state.current_fuel)
-                total_speed_knots = barge_speed_knots + tide_speed
-                total_speed_m_per_min = knots_to_m_per_minute(total_speed_knots)
-
-                movement = direction * min(abs(distance_remaining), abs(total_speed_m_per_min)) # abs = absolute value = módulo
-                barge_state.location += movement
-
-                if abs(barge_state.location - target) < 1e-6: # handle possible floating-point errors, considering a very-small difference (epsilon)
-                    barge_state.location = target
-                    barge_state.action_queue.pop(0)
-
-            elif action in ["SETUP_INIT", "SETUP_END"]:
-                if parts[1] == "ORIGIN":
-                    setup_time = self.problem_instance.origin_setup_time
-                else:
-                    setup_time = self.problem_instance.vessel_setup_time
+        action, operand = barge_state.action_queue[0]
+        tide_speed = self.problem_instance.get_tide_speed_at(time)
 
-                is_init = (action == "SETUP_INIT")
-                progress_attr = "setup_init_progress" if is_init else "setup_end_progress"
+        if action == ActionType.GO:
+            target = operand
+            distance_remaining = target - barge_state.location
+            direction = 1 if distance_remaining > 0 else -1
 
-                current_progress = getattr(barge_state, progress_attr)
-                new_progress, finished = advance_setup(current_progress, setup_time)
-                setattr(barge_state, progress_attr, new_progress)
+            # Calculate effective speed (knots to m/min)
+            total_speed_knots = barge_state.get_speed_knots(direction, tide_speed)
+            total_speed_m_per_min = knots_to_m_per_minute(total_speed_knots)
 
-                if finished: # when an action finishes, it gets removed immediately, so we can perform on another action in the next minute
-                    setattr(barge_state, progress_attr, None)
-                    if not is_init:
-                        barge_state.current_vessel_id = None
-                    barge_state.action_queue.pop(0)
+            movement = direction * min(abs(distance_remaining), abs(total_speed_m_per_min)) # abs = absolute value = módulo
+            barge_state.location += movement
 
-            elif action == "REFUEL":
-                flow = self.problem_instance.fuel_flow_rate_per_minute
-                barge_state.current_fuel = min(barge_state.barge.fuel_capacity, barge_state.current_fuel + flow) # limits the current fuel to the fuel capacity
-                if barge_state.current_fuel >= barge_state.barge.fuel_capacity:
-                    barge_state.action_queue.pop(0)
+            if abs(barge_state.location - target) < 1e-6: # handle possible floating-point errors, considering a very-small difference (epsilon)
+                barge_state.location = target
+                self._complete_action(barge_state)
 
-            elif action == "FUEL":
-                vessel_id = int(parts[1])
-                vessel_state = next((v for v in new_state.vessel_states if v.vessel.id == vessel_id), None)
-                if vessel_state is None:
-                    continue  # Shouldn't happen
+        elif action == ActionType.SETUP_INIT or action == ActionType.SETUP_END:
+            if operand == ORIGIN_ID:
+                setup_time = self.problem_instance.origin_setup_time
+            else:
+                setup_time = self.problem_instance.vessel_setup_time
 
-                flow = self.problem_instance.fuel_flow_rate_per_minute
-                # the transferred volumed is determined between the lowest value among: flow (physical limit), fuel_demand (how much the vessel still needs) and current_fuel (how much the barge can still provide)
-                transferred = min(flow, vessel_state.current_fuel_demand, barge_state.current_fuel)
+            is_init = (action == ActionType.SETUP_INIT)
+            progress_attr = "setup_init_progress" if is_init else "setup_end_progress"
 
-                barge_state.current_fuel -= transferred
-                vessel_state.current_fuel_demand -= transferred
+            current_progress = getattr(barge_state, progress_attr)
+            new_progress, finished = advance_setup(current_progress, setup_time)
+            setattr(barge_state, progress_attr, new_progress)
 
-                if vessel_state.current_fuel_demand <= 0 or barge_state.current_fuel <= 0 or vessel_state.vessel.departure_time-1 <= self.time + self.problem_instance.vessel_setup_time:
-                    barge_state.action_queue.pop(0)
+            if finished: # when an action finishes, it gets removed immediately, so we can perform on another action in the next minute
+                setattr(barge_state, progress_attr, None)
+                if not is_init:
+                    self._finish_assignment(barge_state)
+                self._complete_action(barge_state)
 
-        # Finally, advance the time
-        new_state.time += 1
+        elif action == ActionType.REFUEL:
+            flow = self.problem_instance.fuel_flow_rate_per_minute
+            barge_state.current_fuel = min(barge_state.barge.fuel_capacity, barge_state.current_fuel + flow) # limits the current fuel to the fuel capacity
+            if barge_state.current_fuel >= barge_state.barge.fuel_capacity:
+                self._complete_action(barge_state)
+
+        elif action == ActionType.FUEL:
+            vessel_id = operand
+            vessel_state = self.get_vessel_state(vessel_id)
+
+            flow = self.problem_instance.fuel_flow_rate_per_minute
+            # the transferred volumed is determined between the lowest value among: flow (physical limit), fuel_demand (how much the vessel still needs) and current_fuel (how much the barge can still provide)
+            transferred = min(flow, vessel_state.current_fuel_demand, barge_state.current_fuel)
 
-        return new_state
+            barge_state.current_fuel -= transferred
+            vessel_state.current_fuel_demand -= transferred
+
+            if vessel_state.current_fuel_demand <= 0 or barge_state.current_fuel <= 0 or vessel_state.vessel.departure_time-1 <= time + self.problem_instance.vessel_setup_time:
+                self._complete_action(barge_state)
+
+    def advance_barge_until(self, barge_state, time, until):
+        """
+        Advances a single barge from the given time until either its queue is empty or the time `until` is reached,
+        without touching the other barges or the state's clock. It gives the same result as calling advance_barge
+        minute by minute, but setups are skipped in one jump and the other actions run in a tight loop.
+        Returns the time reached by the barge.
+        """
+        while barge_state.action_queue and time < until:
+            action, operand = barge_state.action_queue[0]
+            if action == ActionType.SETUP_INIT or action == ActionType.SETUP_END:
+                setup_time = self.problem_instance.origin_setup_time if operand == ORIGIN_ID else self.problem_instance.vessel_setup_time
+                progress_attr = "setup_init_progress" if action == ActionType.SETUP_INIT else "setup_end_progress"
+                current_progress = getattr(barge_state, progress_attr)
+                # same count as advance_barge: the first minute only starts the setup, then it runs until setup_time
+                if current_progress is None:
+                    minutes_left = 1 + max(1, setup_time - 1)
+                else:
+                    minutes_left = max(1, setup_time - current_progress)
+                if time + minutes_left > until:
+                    setattr(barge_state, progress_attr, (current_progress or 0) + until - time)
+                    return until
+                setattr(barge_state, progress_attr, None)
+                if action == ActionType.SETUP_END:
+                    self._finish_assignment(barge_state)
+                self._complete_action(barge_state)
+                time += minutes_left
+            elif action == ActionType.GO:
+                # same arithmetic as advance_barge, kept in locals; the fuel doesn't change while moving
+                target = operand
+                location = barge_state.location
+                barge_speed = barge_state.barge.base_move_speed_knots - barge_state.barge.move_speed_per_ton * barge_state.current_fuel
+                while time < until:
+                    distance_remaining = target - location
+                    direction = 1 if distance_remaining > 0 else -1
+                    total_speed_knots = direction * barge_speed + self.problem_instance.get_tide_speed_at(time)
+                    location += direction * min(abs(distance_remaining), abs(total_speed_knots * 1852 / 60))
+                    time += 1
+                    if abs(location - target) < 1e-6:
+                        location = target
+                        self._complete_action(barge_state)
+                        break
+                barge_state.location = location
+            elif action == ActionType.REFUEL:
+                flow = self.problem_instance.fuel_flow_rate_per_minute
+                capacity = barge_state.barge.fuel_capacity
+                fuel = barge_state.current_fuel
+                while time < until:
+                    fuel = min(capacity, fuel + flow)
+                    time += 1
+                    if fuel >= capacity:
+                        self._complete_action(barge_state)
+                        break
+                barge_state.current_fuel = fuel
+            elif action == ActionType.FUEL:
+                vessel_id = operand
+                vessel_state = self.get_vessel_state(vessel_id)
+                flow = self.problem_instance.fuel_flow_rate_per_minute
+                # the transfer must stop while there is still time to undo the setup before departure
+                last_start = vessel_state.vessel.departure_time - 1 - self.problem_instance.vessel_setup_time
+                fuel = barge_state.current_fuel
+                demand = vessel_state.current_fuel_demand
+                while time < until:
+                    transferred = min(flow, demand, fuel)
+                    fuel -= transferred
+                    demand -= transferred
+                    time += 1
+                    if demand <= 0 or fuel <= 0 or last_start <= time - 1:
+                        self._complete_action(barge_state)
+                        break
+                barge_state.current_fuel = fuel
+                vessel_state.current_fuel_demand = demand
+        return time
     
     def to_dict(self):
         tide_speed = self.problem_instance.get_tide_speed_at(self.time)
@@ -203,7 +515,7 @@ class PortState:
                     "current_vessel_id": b.current_vessel_id,
                     "setup_init_progress": b.setup_init_progress,
                     "setup_end_progress": b.setup_end_progress,
-                    "action_queue": b.action_queue,
+                    "action_queue": [str(a) for a in b.action_queue],
                     "speed": b.get_speed_knots(1, tide_speed)
                 }
                 for b in self.barge_states
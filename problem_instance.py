@@ -1,7 +1,9 @@
 import random
 import json
+import bisect
 from typing import List, Self
 import math
+import numpy as np
 
 DISTANCE_BETWEEN_POINTS_IN_METERS = 370
 NUMBER_OF_POINTS = 67 # total 68, as 0 is the source
@@ -31,6 +33,25 @@ STD_VESSELS = 5 #sigma (standard deviation) controls the spread of values.
 
 MIN_FUEL = 0.05 #if a barge has less than this amount, it must refuel
 
+# The tide repeats every period and is the same for every instance, so its speed for each minute of one period
+# is computed once per (amplitude, period). Instances that override them simply use another table.
+_tide_tables = {}
+
+def get_tide_table(amplitude, period):
+    """
+    Returns the tide speed for every minute of one period.
+    """
+    key = (amplitude, period)
+    if key not in _tide_tables:
+        _tide_tables[key] = [amplitude * math.sin(2 * math.pi * t / period) for t in range(period)]
+    return _tide_tables[key]
+
+def barge_speed_knots(direction, current_fuel, base_move_speed_knots, move_speed_per_ton, tide_speed):
+    """
+    Speed of barges moving in the given direction (1 or -1), including the tide. Works on scalars and on NumPy arrays.
+    """
+    return direction * (base_move_speed_knots - move_speed_per_ton * current_fuel) + tide_speed
+
 class Vessel:
     def __init__(self, vessel_id: int, arrival_time: int, departure_time: int, fuel_demand: int, point: int):
         self.id = vessel_id
@@ -89,6 +110,25 @@ class Vessel:
         )
 
 
+class BerthSchedule:
+    """
+    The [arrival, departure) intervals already taken at every point, sorted, so checking whether a point is free
+    is a binary search instead of a comparison with every vessel.
+    """
+    def __init__(self, num_points: int):
+        self.arrivals = [[] for _ in range(num_points + 1)] # point 0 is the origin, and is never used
+        self.departures = [[] for _ in range(num_points + 1)]
+
+    def is_free(self, point: int, arrival_time: int, departure_time: int):
+        # the intervals of a point don't overlap, so only the last one starting before the departure can collide
+        i = bisect.bisect_left(self.arrivals[point], departure_time)
+        return i == 0 or self.departures[point][i - 1] <= arrival_time
+
+    def add(self, point: int, arrival_time: int, departure_time: int):
+        i = bisect.bisect_left(self.arrivals[point], departure_time)
+        self.arrivals[point].insert(i, arrival_time)
+        self.departures[point].insert(i, departure_time)
+
 class Barge:
     def __init__(self, barge_id: int, fuel_capacity: int):
         self.id = barge_id
@@ -132,7 +172,9 @@ class ProblemInstance:
         self.vessel_setup_time = VESSEL_SETUP_TIME
     
     def get_tide_speed_at(self: Self, t: int):
-        return self.tide_amplitude * math.sin(2 * math.pi * t / self.tide_period) # converts a 2*pi period to a 24h period
+        if not isinstance(self.tide_period, int):
+            return self.tide_amplitude * math.sin(2 * math.pi * t / self.tide_period) # converts a 2*pi period to a 24h period
+        return get_tide_table(self.tide_amplitude, self.tide_period)[t % self.tide_period]
     
     @staticmethod
     def generate():
@@ -148,12 +190,47 @@ class ProblemInstance:
         barges = [Barge.generate(barge_id=i+1) for i in range(num_barges)]
         
         return ProblemInstance(vessels=vessels, barges=barges)
+
+    @staticmethod
+    def generate_scaled(rng: np.random.Generator, num_vessels: int = None, horizon: int = 24*60,
+                        num_points: int = NUMBER_OF_POINTS, num_barges: int = NUM_BARGES, max_attempts: int = 100):
+        """
+        Like `generate`, with the scale as parameters, for large benchmark instances: vessels arrive in [0, horizon]
+        at points 1..num_points. Each vessel picks its berth among the points that are free for its whole stay,
+        using a BerthSchedule, so no vessel is compared with all the others.
+        Raises ValueError if a vessel finds no free point after `max_attempts` arrival times.
+        """
+        if num_vessels is None:
+            num_vessels = max(7, int(rng.normal(MEAN_VESSELS, STD_VESSELS)))
+        schedule = BerthSchedule(num_points)
+        vessels = []
+        for i in range(num_vessels):
+            for _ in range(max_attempts):
+                arrival_time = int(rng.integers(0, horizon, endpoint=True))
+                departure_time = arrival_time + int(rng.integers(VESSEL_MIN_STAY_TIME_MINUTES, VESSEL_MAX_STAY_TIME_MINUTES, endpoint=True))
+                # points in random order, so the first free one is uniform among the free ones
+                point = next((int(p) for p in rng.permutation(num_points) + 1 if schedule.is_free(p, arrival_time, departure_time)), None)
+                if point is not None:
+                    break
+            else:
+                raise ValueError(f"No free point for vessel {i+1}: too many vessels for {num_points} points in {horizon} minutes")
+            schedule.add(point, arrival_time, departure_time)
+            vessels.append(Vessel(
+                vessel_id=i+1,
+                arrival_time=arrival_time,
+                departure_time=departure_time,
+                fuel_demand=int(rng.integers(VESSEL_MIN_FUEL_DEMAND, VESSEL_MAX_FUEL_DEMAND, endpoint=True)),
+                point=point
+            ))
+        barges = [Barge(barge_id=i+1, fuel_capacity=int(rng.choice(BARGE_FUEL_CAPACITY_OPTIONS))) for i in range(num_barges)]
+
+        return ProblemInstance(vessels=vessels, barges=barges)
     
     def to_json(self):
         return json.dumps({
             **self.__dict__,
-            "vessels": [json.loads(v.to_json()) for v in self.vessels],
-            "barges": [json.loads(b.to_json()) for b in self.barges],
+            "vessels": [v.__dict__ for v in self.vessels],
+            "barges": [b.__dict__ for b in self.barges],
         }, indent=4)
     
     @staticmethod
@@ -170,3 +247,35 @@ class ProblemInstance:
         instance.fuel_flow_rate_per_minute = data['fuel_flow_rate_per_minute']
         
         return instance
+
+    @staticmethod
+    def from_bank(bank, i: int) -> Self:
+        """
+        Reads instance i (its row, not its id) of an InstanceBank (see instance_bank.py).
+        """
+        vessel_start, vessel_end = bank.vessel_offsets[i], bank.vessel_offsets[i + 1]
+        barge_start, barge_end = bank.barge_offsets[i], bank.barge_offsets[i + 1]
+        # .tolist() gives Python numbers, as from_json would
+        vessels = [
+            Vessel(vessel_id=vessel_id, arrival_time=arrival_time, departure_time=departure_time, fuel_demand=fuel_demand, point=point)
+            for vessel_id, arrival_time, departure_time, fuel_demand, point in zip(*(
+                getattr(bank, column)[vessel_start:vessel_end].tolist()
+                for column in ['vessel_id', 'arrival_time', 'departure_time', 'fuel_demand', 'point']))
+        ]
+        barges = []
+        for barge_id, fuel_capacity, base_move_speed_knots, move_speed_per_ton in zip(*(
+                getattr(bank, column)[barge_start:barge_end].tolist()
+                for column in ['barge_id', 'fuel_capacity', 'base_move_speed_knots', 'move_speed_per_ton'])):
+            barge = Barge(barge_id=barge_id, fuel_capacity=fuel_capacity)
+            barge.base_move_speed_knots = base_move_speed_knots
+            barge.move_speed_per_ton = move_speed_per_ton
+            barges.append(barge)
+        instance = ProblemInstance(vessels=vessels, barges=barges)
+
+        instance.tide_amplitude = bank.tide_amplitude[i].item()
+        instance.tide_period = bank.tide_period[i].item()
+        instance.fuel_flow_rate_per_minute = bank.fuel_flow_rate_per_minute[i].item()
+        instance.origin_setup_time = bank.origin_setup_time[i].item()
+        instance.vessel_setup_time = bank.vessel_setup_time[i].item()
+
+        return instance
@@ -0,0 +1,87 @@
+import time
+import json
+from contextlib import nullcontext
+
+# Optional instrumentation of `solve` and PortState. Without a Profiler, solve uses a NullProfiler, whose phases and
+# counters do nothing, and the PortState counters are on the rare paths (clones and completed actions).
+
+PHASES = ['record', 'enumerate', 'choose', 'apply', 'metrics', 'step']
+
+
+class Profiler:
+    """
+    Seconds spent in each phase of `solve` and counts of what happened: ticks (minutes simulated), candidates
+    (assignments the policy chose from), assignments (committed), clones (state copies), completed_<ACTION>.
+    """
+    def __init__(self):
+        self.timers = {phase: 0.0 for phase in PHASES}
+        self.counters = {'ticks': 0, 'candidates': 0, 'assignments': 0, 'clones': 0}
+
+    def phase(self, phase):
+        """
+        Returns a context manager adding the time spent in its block to the phase.
+        """
+        return Phase(self.timers, phase)
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def report(self):
+        return {'timers': dict(self.timers), 'counters': dict(self.counters)}
+
+
+class Phase:
+    __slots__ = ('timers', 'name', 'start')
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.timers[self.name] = self.timers.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class NullProfiler:
+    """
+    The profiler of the runs that aren't profiled: measures nothing.
+    """
+    _phase = nullcontext()
+
+    def __bool__(self):
+        return False # so `if profiler` skips what only matters when profiling
+
+    def phase(self, phase):
+        return self._phase
+
+    def count(self, counter, n=1):
+        pass
+
+
+def merge_reports(reports):
+    """
+    Sums the timers and counters of several reports.
+    """
+    merged = {'timers': {}, 'counters': {}}
+    for report in reports:
+        for section in merged:
+            for name, value in report[section].items():
+                merged[section][name] = merged[section].get(name, 0) + value
+    return merged
+
+
+def format_report(report):
+    total = sum(report['timers'].values())
+    lines = [f"{'phase':<12}{'seconds':>12}{'share':>9}"]
+    for phase, seconds in sorted(report['timers'].items(), key=lambda item: -item[1]):
+        lines.append(f"{phase:<12}{seconds:>12.4f}{100 * seconds / total if total else 0:>8.1f}%")
+    lines.append("")
+    lines.extend(f"{name:<24}{value:>12}" for name, value in sorted(report['counters'].items()))
+    return "\n".join(lines)
+
+
+def write_report(path, report):
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=4)
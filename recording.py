@@ -0,0 +1,72 @@
+# Recorders decide which minutes of a simulation are kept by `solve`.
+# `record` is called every minute, before that minute's decisions, and `last` is True on the final minute,
+# which every recorder keeps.
+
+
+class FullRecorder:
+    """
+    Keeps every minute (the default).
+    """
+    def __init__(self):
+        self.states = []
+
+    def record(self, state, last):
+        self.states.append(state.to_dict())
+
+
+class SampledRecorder:
+    """
+    Keeps one minute every `every` minutes.
+    """
+    def __init__(self, every):
+        self.every = every
+        self.states = []
+
+    def record(self, state, last):
+        if state.time % self.every == 0 or last:
+            self.states.append(state.to_dict())
+
+
+class EventRecorder:
+    """
+    Keeps only the minutes where something changed: an assignment or a finished action since the last minute,
+    or a vessel arriving or departing.
+    """
+    def __init__(self):
+        self.states = []
+        self.last_event_count = None
+        self.vessel_event_times = None
+
+    def record(self, state, last):
+        if self.vessel_event_times is None:
+            self.vessel_event_times = {t for v in state.problem_instance.vessels for t in (v.arrival_time, v.departure_time)}
+        if state.event_count != self.last_event_count or state.time in self.vessel_event_times or last:
+            self.states.append(state.to_dict())
+        self.last_event_count = state.event_count
+
+
+class FinalStateRecorder:
+    """
+    Keeps only the final minute.
+    """
+    def __init__(self):
+        self.states = []
+
+    def record(self, state, last):
+        if last:
+            self.states.append(state.to_dict())
+
+
+def make_recorder(mode, every=60):
+    """
+    Returns a recorder from its name: 'full', 'sampled' (every `every` minutes), 'events' or 'final'.
+    """
+    if mode == 'full':
+        return FullRecorder()
+    if mode == 'sampled':
+        return SampledRecorder(every)
+    if mode == 'events':
+        return EventRecorder()
+    if mode == 'final':
+        return FinalStateRecorder()
+    raise ValueError(f"Unknown recording mode {mode}")
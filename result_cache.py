@@ -0,0 +1,81 @@
+import hashlib
+import inspect
+import json
+import os
+
+# The modules whose code decides the content of every solution (array_state for the trajectory's action codes,
+# profiling for the saved profiles). Each algorithm adds its own code to them, see algorithm.ALGORITHM_CODE
+SIMULATION_FILES = ['problem_instance.py', 'port_state.py', 'array_state.py', 'recording.py', 'metrics.py',
+                    'trajectory.py', 'column_table.py', 'profiling.py']
+
+
+def code_version(files=SIMULATION_FILES, objects=()):
+    """
+    Returns a hash of the source of some modules, and of some functions and classes (only their own source, not the
+    rest of their module).
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in files:
+        with open(os.path.join(directory, filename), 'rb') as file:
+            digest.update(filename.encode())
+            digest.update(file.read())
+    for obj in objects:
+        digest.update(obj.__qualname__.encode())
+        digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+def task_key(instance, algorithm_name, parameters):
+    """
+    Returns the hash identifying a task's results: the instance's content (not its file or row), the algorithm and
+    its parameters (seeds, recording, code version...).
+    """
+    digest = hashlib.sha256()
+    for part in (instance.to_json(), algorithm_name, json.dumps(parameters, sort_keys=True)):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    The up to date results of a solutions folder: instance id -> key of the task that produced them, their files
+    and how long it took (in seconds, if known).
+    It's saved as <folder>.manifest.json next to the folder every `save_every` finished tasks (and by the caller once
+    it's done), and a task is only added once its files are written, so after a crash only the unfinished tasks and
+    the last unsaved ones are missing from it.
+    """
+    def __init__(self, folder, save_every=20):
+        self.folder = folder.rstrip('/')
+        self.path = self.folder + '.manifest.json'
+        self.save_every = save_every
+        self.unsaved = 0
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as manifest_file:
+                self.entries = json.load(manifest_file)
+
+    def is_done(self, instance_id, key):
+        """
+        Whether the results of the task with this key are saved (its files may have been deleted since).
+        """
+        entry = self.entries.get(instance_id)
+        return entry is not None and entry['key'] == key and \
+            all(os.path.exists(os.path.join(self.folder, filename)) for filename in entry['files'])
+
+    def add(self, instance_id, key, filenames, seconds=None):
+        self.entries[instance_id] = {'key': key, 'files': sorted(filenames)}
+        if seconds is not None:
+            self.entries[instance_id]['seconds'] = seconds
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        self.unsaved = 0
+        # written next to it first, so a crash while saving keeps the previous manifest
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(self.entries, manifest_file, indent=4, sort_keys=True)
+        os.replace(temporary_path, self.path)
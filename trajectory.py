@@ -0,0 +1,160 @@
+from array_state import ACTION_NAMES, IDLE
+from port_state import ORIGIN_ID
+from column_table import ColumnTable
+import numpy as np
+import pickle
+import os
+
+# Special values of the id columns, with ORIGIN_ID (from port_state)
+NO_ID = -1
+
+STATIC_COLUMNS = ['barge_id', 'fuel_capacity', 'vessel_id', 'position', 'fuel_demand', 'arrival_time', 'departure_time']
+TIME_COLUMNS = ['time', 'tide_speed']
+BARGE_COLUMNS = ['location', 'current_fuel', 'current_vessel_id', 'setup_init_progress', 'setup_end_progress',
+                 'action', 'action_target', 'queue_length', 'speed']
+VESSEL_COLUMNS = ['current_fuel_demand']
+
+
+def encode_id(value):
+    if value is None:
+        return NO_ID
+    if value == 'ORIGIN':
+        return ORIGIN_ID
+    return value
+
+
+def decode_id(value):
+    if value == NO_ID:
+        return None
+    if value == ORIGIN_ID:
+        return 'ORIGIN'
+    return value
+
+
+class Trajectory(ColumnTable):
+    """
+    Columnar version of the list of states returned by `solve`: the static data of the barges and vessels is stored
+    once, and every changing attribute is an array indexed by minute x barge (or minute x vessel).
+
+    Action queues always follow GO -> SETUP_INIT -> FUEL (or REFUEL) -> SETUP_END, so they are stored as the action
+    at the head of the queue, its target and the number of actions left.
+    """
+    LENGTH_COLUMN = 'time'
+
+    @staticmethod
+    def from_states(states):
+        first = states[0]
+        columns = {
+            'barge_id': np.array([b['id'] for b in first['barges']]),
+            'fuel_capacity': np.array([b['fuel_capacity'] for b in first['barges']]),
+            'vessel_id': np.array([v['id'] for v in first['vessels']]),
+            'position': np.array([v['position'] for v in first['vessels']]),
+            'fuel_demand': np.array([v['fuel_demand'] for v in first['vessels']]),
+            'arrival_time': np.array([v['arrival_time'] for v in first['vessels']]),
+            'departure_time': np.array([v['departure_time'] for v in first['vessels']]),
+            'time': np.array([s['time'] for s in states]),
+            'tide_speed': np.array([s['tide_speed'] for s in states], dtype=float),
+            'location': np.array([[b['location'] for b in s['barges']] for s in states], dtype=float),
+            'current_fuel': np.array([[b['current_fuel'] for b in s['barges']] for s in states], dtype=float),
+            'current_vessel_id': np.array([[encode_id(b['current_vessel_id']) for b in s['barges']] for s in states]),
+            'setup_init_progress': np.array([[b['setup_init_progress'] or 0 for b in s['barges']] for s in states], dtype=np.int32),
+            'setup_end_progress': np.array([[b['setup_end_progress'] or 0 for b in s['barges']] for s in states], dtype=np.int32),
+            'speed': np.array([[b['speed'] for b in s['barges']] for s in states], dtype=float),
+            'current_fuel_demand': np.array([[v['current_fuel_demand'] for v in s['vessels']] for s in states], dtype=float),
+        }
+        queues = [[Trajectory.encode_queue(b['action_queue']) for b in s['barges']] for s in states]
+        columns['action'] = np.array([[q[0] for q in row] for row in queues], dtype=np.int8)
+        columns['action_target'] = np.array([[q[1] for q in row] for row in queues])
+        columns['queue_length'] = np.array([[q[2] for q in row] for row in queues], dtype=np.int8)
+        return Trajectory(columns)
+
+    @staticmethod
+    def encode_queue(action_queue):
+        """
+        Returns (action code, target id, length) for an action queue of strings.
+        """
+        if not action_queue:
+            return IDLE, NO_ID, 0
+        action, _, target = action_queue[-1].partition(":") # the last action (SETUP_END) always names the target
+        if action != 'SETUP_END':
+            raise ValueError(f"Unexpected action queue {action_queue}")
+        return ACTION_NAMES.index(action_queue[0].partition(":")[0]), encode_id(target if target == 'ORIGIN' else int(target)), len(action_queue)
+
+    def decode_queue(self, i, b):
+        length = self.queue_length[i, b]
+        if length == 0:
+            return []
+        target = decode_id(self.action_target[i, b].item())
+        if target == 'ORIGIN':
+            queue = ['GO:0', 'SETUP_INIT:ORIGIN', 'REFUEL', 'SETUP_END:ORIGIN']
+        else:
+            position = self.position[np.flatnonzero(self.vessel_id == target)[0]].item()
+            queue = [f'GO:{position}', f'SETUP_INIT:{target}', f'FUEL:{target}', f'SETUP_END:{target}']
+        return queue[len(queue) - length:]
+
+    def state(self, i):
+        """
+        Returns the state of row i in the format of PortState.to_dict.
+        """
+        return {
+            "time": self.time[i].item(),
+            "tide_speed": self.tide_speed[i].item(),
+            "barges": [
+                {
+                    "id": self.barge_id[b].item(),
+                    "location": self.location[i, b].item(),
+                    "current_fuel": self.current_fuel[i, b].item(),
+                    "fuel_capacity": self.fuel_capacity[b].item(),
+                    "current_vessel_id": decode_id(self.current_vessel_id[i, b].item()),
+                    "setup_init_progress": self.setup_init_progress[i, b].item() or None,
+                    "setup_end_progress": self.setup_end_progress[i, b].item() or None,
+                    "action_queue": self.decode_queue(i, b),
+                    "speed": self.speed[i, b].item()
+                }
+                for b in range(len(self.barge_id))
+            ],
+            "vessels": [
+                {
+                    "id": self.vessel_id[v].item(),
+                    "position": self.position[v].item(),
+                    "current_fuel_demand": self.current_fuel_demand[i, v].item(),
+                    "fuel_demand": self.fuel_demand[v].item(),
+                    "arrival_time": self.arrival_time[v].item(),
+                    "departure_time": self.departure_time[v].item()
+                }
+                for v in range(len(self.vessel_id))
+            ]
+        }
+
+    def states(self):
+        return [self.state(i) for i in range(len(self))]
+
+
+def load_solution(path):
+    """
+    Loads a solution either as a Trajectory (.npz) or as the legacy pickled list of states.
+    """
+    if path.endswith('.npz'):
+        return Trajectory.load(path)
+    with open(path, 'rb') as solution_file:
+        return Trajectory.from_states(pickle.load(solution_file))
+
+
+def convert_solutions(folder):
+    """
+    Converts every pickled solution of a folder to a .npz trajectory next to it.
+    """
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.pickle'):
+            print("Converting", os.path.join(folder, filename))
+            load_solution(os.path.join(folder, filename)).save(os.path.join(folder, filename.replace('.pickle', '.npz')))
+
+
+def main():
+    for folder in ['solutions_greedy', 'solutions_random']:
+        if os.path.isdir(folder):
+            convert_solutions(folder)
+
+
+if __name__ == "__main__":
+    main()